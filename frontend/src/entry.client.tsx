@@ -13,11 +13,18 @@ axios.defaults.withCredentials = true;
 
 import { useAuthStore } from "./stores/useAuthStore";
 import { QueryClient, QueryClientProvider } from "@tanstack/react-query";
+import { readBootstrap } from "./lib/bootstrap";
+import { CAMPAIGN_QUERY_KEY } from "./hooks/useCampaigns";
 
 const queryClient = new QueryClient();
 
+const bootstrap = readBootstrap();
+if (bootstrap?.campaigns) {
+  queryClient.setQueryData([CAMPAIGN_QUERY_KEY], bootstrap.campaigns);
+}
+
 const authStore = useAuthStore.getState();
-authStore.checkAuth();
+authStore.checkAuth(bootstrap?.user);
 
 const ClientOnlyPostHogProvider = ({ children }: { children: ReactNode }) => {
   const isClient = typeof window !== "undefined";
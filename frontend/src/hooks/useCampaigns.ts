@@ -1,7 +1,7 @@
 import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
 import axiosInstance from "@/lib/axios";
 
-const CAMPAIGN_QUERY_KEY = "campaigns";
+export const CAMPAIGN_QUERY_KEY = "campaigns";
 
 export interface User {
   id: number;
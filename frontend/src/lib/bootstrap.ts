@@ -0,0 +1,41 @@
+// Data the server inlines into the page for logged-in loads (gimli/spa.py),
+// so the first render doesn't wait on /api/auth/user/ and the campaign list.
+
+export interface Bootstrap {
+  user?: {
+    id: number;
+    email: string;
+    first_name?: string;
+    last_name?: string;
+  };
+  campaigns?: unknown[];
+}
+
+const ELEMENT_ID = "gimli-bootstrap";
+
+function tokenUserId(token: string): number | null {
+  try {
+    const payload = token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/");
+    return JSON.parse(atob(payload)).user_id ?? null;
+  } catch {
+    return null;
+  }
+}
+
+// Returns the payload once and removes it from the page. It's ignored when
+// it belongs to someone other than the user of the stored access token.
+export function readBootstrap(): Bootstrap | null {
+  if (typeof document === "undefined") return null;
+  const element = document.getElementById(ELEMENT_ID);
+  if (!element) return null;
+  element.remove();
+
+  const token = localStorage.getItem("access_token");
+  try {
+    const bootstrap: Bootstrap = JSON.parse(element.textContent || "");
+    if (!token || bootstrap.user?.id !== tokenUserId(token)) return null;
+    return bootstrap;
+  } catch {
+    return null;
+  }
+}
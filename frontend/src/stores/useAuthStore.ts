@@ -14,7 +14,7 @@ interface AuthState {
   loading: boolean;
   login: (googleResponse: any) => Promise<void>;
   logout: () => Promise<void>;
-  checkAuth: () => Promise<void>;
+  checkAuth: (bootstrapUser?: User) => Promise<void>;
   getAuthState: () => {
     user: User | null;
     isAuthenticated: boolean;
@@ -111,6 +111,8 @@ export const useAuthStore = create<AuthState>((set, get) => ({
 
   logout: async () => {
     try {
+      // Drops the auth cookie the server inlines page data for
+      await axios.post("/api/auth/logout/").catch(() => undefined);
       localStorage.removeItem("access_token");
       localStorage.removeItem("refresh_token");
       delete axios.defaults.headers.common["Authorization"];
@@ -121,7 +123,7 @@ export const useAuthStore = create<AuthState>((set, get) => ({
     }
   },
 
-  checkAuth: async () => {
+  checkAuth: async (bootstrapUser) => {
     try {
       const token = localStorage.getItem("access_token");
       if (!token) {
@@ -132,6 +134,12 @@ export const useAuthStore = create<AuthState>((set, get) => ({
       // Set the authorization header for all requests
       axios.defaults.headers.common["Authorization"] = `Bearer ${token}`;
 
+      // The server already answered /api/auth/user/ for this page load
+      if (bootstrapUser) {
+        set({ user: bootstrapUser, isAuthenticated: true, loading: false });
+        return;
+      }
+
       const response = await axios.get("/api/auth/user/");
 
       // Only update state if there's a change to avoid unnecessary re-renders
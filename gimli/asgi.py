@@ -2,5 +2,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gimli.settings')
+# Under ASGI the hot read endpoints run as native async views
+os.environ.setdefault('ASYNC_READS', 'True')
 
-application = get_asgi_application() 
\ No newline at end of file
+application = get_asgi_application()
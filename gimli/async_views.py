@@ -0,0 +1,178 @@
+"""
+Native async GET handling for DRF views under ASGI.
+
+DRF views are synchronous, so under ASGI every request would be handed to a
+thread. `async_read_view` serves GETs from an async `a<action>` handler on
+the view instead and awaits the async ORM only for the queries themselves.
+Authentication, negotiation, permission checks, serializers and rendering
+run unchanged from the DRF view, on the event loop.
+
+Only requests carrying a Bearer token take the async path: JWT
+authentication loads an uncached user row on the async ORM first (see
+`aprepare` on gimli.users.authentication.CachedJWTAuthentication), whereas
+session authentication queries synchronously. Everything else, including every other method, goes through the
+regular DRF view in a thread, so the two paths behave the same.
+"""
+
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import (
+    ObjectDoesNotExist,
+    SynchronousOnlyOperation,
+    ValidationError,
+)
+from django.http import Http404, HttpResponse
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# What rest_framework.response.Response carries besides its body and headers
+RESPONSE_ATTRIBUTES = (
+    "data",
+    "exception",
+    "accepted_renderer",
+    "accepted_media_type",
+    "renderer_context",
+)
+
+
+class AsyncReadMixin:
+    """
+    The async counterpart of APIView.dispatch, for GETs.
+
+    Views implement `a<action>` (or `aget` on plain APIViews) and may
+    override `aprepare` to load asynchronously whatever their permission
+    checks would otherwise query. `alist` and `aretrieve` mirror DRF's list
+    and retrieve for generic views whose paginator has
+    `apaginate_queryset`.
+    """
+
+    async def aprepare(self, request):
+        pass
+
+    async def adispatch(self, request, *args, **kwargs):
+        """
+        Return the response, or None when the request has to be served by
+        the synchronous view after all.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        action = getattr(self, "action", None) or request.method.lower()
+        handler = getattr(self, f"a{action}", None)
+        if handler is None:
+            return None
+
+        try:
+            for authenticator in request.authenticators:
+                if hasattr(authenticator, "aprepare"):
+                    await authenticator.aprepare(request)
+            self.perform_authentication(request)
+            await self.aprepare(request)
+            self.initial(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except SynchronousOnlyOperation:
+            # Something lazily hit the database; serve it the safe way
+            logger.warning(
+                "Async %s fell back to the sync view: %s",
+                type(self).__name__,
+                request.path,
+                exc_info=True,
+            )
+            return None
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        # Django would hand a response with a deferred render to a thread, so
+        # return a plain copy, cookies and DRF's attributes included
+        self.response.render()
+        rendered = HttpResponse(
+            self.response.content,
+            status=self.response.status_code,
+            headers=self.response.headers,
+        )
+        rendered.cookies = self.response.cookies
+        for attr in RESPONSE_ATTRIBUTES:
+            if hasattr(self.response, attr):
+                setattr(rendered, attr, getattr(self.response, attr))
+        return rendered
+
+    async def alist(self, request, *args, **kwargs):
+        """ListModelMixin.list on the async ORM"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer([obj async for obj in queryset], many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """RetrieveModelMixin.retrieve on the async ORM"""
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (ObjectDoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(
+            queryset, self.request, view=self
+        )
+
+
+def has_bearer_token(request):
+    return request.headers.get("Authorization", "").startswith("Bearer ")
+
+
+def async_read_view(view_class, actions=None, **initkwargs):
+    """
+    `view_class.as_view()` with GETs served natively async when
+    ASYNC_READS is on. With it off, the plain DRF view is returned.
+    """
+    if actions is None:
+        sync_view = view_class.as_view(**initkwargs)
+    else:
+        sync_view = view_class.as_view(actions, **initkwargs)
+    if not settings.ASYNC_READS:
+        return sync_view
+
+    run_sync = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method == "GET" and has_bearer_token(request):
+            instance = view_class(**initkwargs)
+            if actions is not None:
+                instance.action_map = actions
+            instance.request = request
+            response = await instance.adispatch(request, *args, **kwargs)
+            if response is not None:
+                return response
+        return await run_sync(request, *args, **kwargs)
+
+    # DRF views are CSRF exempt; session-authenticated writes still get
+    # checked by SessionAuthentication in the sync view
+    view.csrf_exempt = True
+    view.cls = view_class
+    view.initkwargs = initkwargs
+    view.actions = actions
+    return view
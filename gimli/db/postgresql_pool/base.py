@@ -0,0 +1,102 @@
+"""
+PostgreSQL backend that takes connections from a psycopg 3 connection pool.
+
+This mirrors the OPTIONS["pool"] setting Django gains in 5.1. When the
+option is set, every process keeps one psycopg_pool.ConnectionPool per
+database alias. Django checks a connection out when it first needs one and
+hands it back when it would otherwise close it, which with CONN_MAX_AGE = 0
+is at the end of every request. The pool's own options (min_size, max_size,
+timeout, max_idle, ...) are passed through unchanged, and CONN_HEALTH_CHECKS
+makes the pool check each connection before handing it out.
+Without the option the backend behaves exactly like Django's.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _connection_pools = {}
+
+    @property
+    def pool(self):
+        pool_options = self.settings_dict["OPTIONS"].get("pool")
+        if self.alias == NO_DB_ALIAS or not pool_options:
+            return None
+
+        # The test runner renames the database after settings are loaded
+        key = (self.alias, self.settings_dict["NAME"])
+        if key not in self._connection_pools:
+            if self.settings_dict["CONN_MAX_AGE"] != 0:
+                raise ImproperlyConfigured(
+                    "Pooled connections require CONN_MAX_AGE = 0."
+                )
+            if not is_psycopg3:
+                raise ImproperlyConfigured("Connection pooling requires psycopg 3.")
+
+            from psycopg_pool import ConnectionPool
+
+            pool_options = {} if pool_options is True else pool_options
+            connect_kwargs = self.get_connection_params()
+            # Pooled connections idle in autocommit; connect() sets the mode
+            # Django wants after checkout
+            connect_kwargs["autocommit"] = True
+            pool = ConnectionPool(
+                kwargs=connect_kwargs,
+                # Opened on first checkout, so forked workers get their own
+                open=False,
+                check=(
+                    ConnectionPool.check_connection
+                    if self.settings_dict["CONN_HEALTH_CHECKS"]
+                    else None
+                ),
+                name=self.alias,
+                **pool_options,
+            )
+            # Another thread may have got here first; an unopened pool can
+            # simply be dropped
+            self._connection_pools.setdefault(key, pool)
+
+        return self._connection_pools[key]
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pool", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = IsolationLevel(
+                options.get("isolation_level", IsolationLevel.READ_COMMITTED)
+            )
+        except ValueError:
+            raise ImproperlyConfigured(
+                f"Invalid transaction isolation level {options['isolation_level']} "
+                f"specified. Use one of the psycopg.IsolationLevel values."
+            )
+        pool.open()
+        connection = pool.getconn()
+        connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            self.pool.putconn(self.connection)
+            # The connection belongs to the pool again
+            self.connection = None
+
+    def close_pool(self):
+        pool = self._connection_pools.pop(
+            (self.alias, self.settings_dict["NAME"]), None
+        )
+        if pool is not None:
+            pool.close()
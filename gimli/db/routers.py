@@ -0,0 +1,156 @@
+"""
+Send reads from the lore and users apps to read replicas.
+
+Reads only go to a replica inside a request that ReplicaRoutingMiddleware
+has cleared for it: a safe-method request from a client that hasn't
+written recently. Unsafe requests, reads inside a transaction on the
+primary, and everything outside a request (management commands, the shell,
+migrations) use the primary. After a write the middleware pins the client
+to the primary for DB_REPLICA_PIN_SECONDS, so people see what they just
+changed: by cookie, and by user id in the default cache for Bearer-token
+clients, which may not keep cookies.
+
+Anything read to fill a cache must come from `primary_reads()`: a replica
+that hasn't replayed the write behind an invalidation would put the old
+rows straight back for the cache's whole TTL.
+
+Every DB_REPLICA_LAG_CHECK_INTERVAL seconds each replica's replication lag
+is measured; a replica further behind than DB_REPLICA_MAX_LAG_SECONDS, or
+one that can't be reached, gets no reads until it catches up. With no
+usable replica, reads go to the primary.
+"""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICATED_APPS = {"gimli.lore", "gimli.users"}
+
+# Whether reads may go to a replica; only requests turn this on
+replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary within the block, whatever the request allows"""
+    token = replica_reads.set(False)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def primary_pin_key(user_id):
+    return f"db:primary-pin:{user_id}"
+
+
+def pin_to_primary(user_id):
+    cache.set(primary_pin_key(user_id), True, settings.DB_REPLICA_PIN_SECONDS)
+
+
+async def apin_to_primary(user_id):
+    await cache.aset(primary_pin_key(user_id), True, settings.DB_REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user_id):
+    return cache.get(primary_pin_key(user_id)) is not None
+
+
+async def ais_pinned_to_primary(user_id):
+    return await cache.aget(primary_pin_key(user_id)) is not None
+
+
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery()
+            OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+        THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+"""
+
+
+class ReplicaHealth:
+    """Per-process replication lag state, refreshed at most once an interval"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = {}
+        self.healthy = {}
+
+    def usable(self, aliases):
+        now = time.monotonic()
+        due = [
+            alias
+            for alias in aliases
+            if now - self.checked_at.get(alias, float("-inf"))
+            >= settings.DB_REPLICA_LAG_CHECK_INTERVAL
+        ]
+        # One thread measures; the others route on the previous result
+        if due and self.lock.acquire(blocking=False):
+            try:
+                for alias in due:
+                    self.check(alias, now)
+            finally:
+                self.lock.release()
+        return [alias for alias in aliases if self.healthy.get(alias, False)]
+
+    def check(self, alias, now):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(LAG_QUERY)
+                lag = float(cursor.fetchone()[0])
+        except SynchronousOnlyOperation:
+            # Routed from the event loop; measure next time
+            return
+        except DatabaseError as exc:
+            healthy, reason = False, f"unreachable ({exc})"
+        else:
+            healthy = lag <= settings.DB_REPLICA_MAX_LAG_SECONDS
+            reason = f"{lag:.1f}s behind"
+
+        # Log changes only; the check runs every few seconds
+        if not healthy and self.healthy.get(alias) is not False:
+            logger.warning("Taking replica %s out of rotation: %s", alias, reason)
+        elif healthy and self.healthy.get(alias) is False:
+            logger.info("Replica %s is back in rotation", alias)
+        self.healthy[alias] = healthy
+        self.checked_at[alias] = now
+
+
+class ReplicaRouter:
+    health = ReplicaHealth()
+
+    def db_for_read(self, model, **hints):
+        if not settings.DB_REPLICAS or not replica_reads.get():
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_config.name not in REPLICATED_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Whatever the transaction wrote is only visible on the primary
+            return DEFAULT_DB_ALIAS
+
+        replicas = self.health.usable(settings.DB_REPLICAS)
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,110 @@
+"""
+What a worker's cold start spends on imports.
+
+A fresh interpreter loads the WSGI application and the URLconf, which is
+what a gunicorn worker pays before and on its first request, and the
+`-X importtime` report it writes is parsed into one record per module.
+Self time is the module's own body; cumulative time includes everything
+it imported first. `startup_time` runs the same load without the
+per-import reporting, whose overhead would otherwise inflate the total.
+"""
+
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+STARTUP_CODE = """
+import time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - started)
+"""
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+@dataclass
+class ImportRecord:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+    @property
+    def package(self):
+        return self.name.partition(".")[0]
+
+
+@dataclass
+class StartupProfile:
+    wall_ms: float
+    imports: list = field(default_factory=list)
+
+    @property
+    def import_ms(self):
+        return sum(record.self_us for record in self.imports) / 1000
+
+    def loaded(self, name):
+        """Whether `name`, or a submodule of it, was imported"""
+        return any(
+            record.name == name or record.name.startswith(name + ".")
+            for record in self.imports
+        )
+
+    def by_package(self):
+        """Self time per top-level package, in milliseconds, largest first"""
+        totals = Counter()
+        for record in self.imports:
+            totals[record.package] += record.self_us
+        return [(package, us / 1000) for package, us in totals.most_common()]
+
+    def slowest(self, count, cumulative=False):
+        key = "cumulative_us" if cumulative else "self_us"
+        return sorted(self.imports, key=lambda r: getattr(r, key), reverse=True)[:count]
+
+
+def run_startup(*options):
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "gimli.settings")
+    result = subprocess.run(
+        [sys.executable, *options, "-c", STARTUP_CODE],
+        cwd=settings.BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Loading the application failed:\n{result.stderr}")
+    return result
+
+
+def profile_startup():
+    """The import-time profile of one cold start"""
+    result = run_startup("-X", "importtime")
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            imports.append(
+                ImportRecord(
+                    name=match.group(4),
+                    self_us=int(match.group(1)),
+                    cumulative_us=int(match.group(2)),
+                    depth=len(match.group(3)) // 2,
+                )
+            )
+    wall_ms = float(result.stdout.split()[-1]) * 1000
+    return StartupProfile(wall_ms=wall_ms, imports=imports)
+
+
+def startup_time(repeat=5):
+    """The fastest of `repeat` cold starts, in milliseconds"""
+    return min(float(run_startup().stdout.split()[-1]) * 1000 for _ in range(repeat))
@@ -0,0 +1,42 @@
+from contextlib import nullcontext
+
+
+class PhaseTimingMixin:
+    """
+    Time the phases of a DRF view into the RequestTimer that
+    InstrumentationMiddleware attaches to the request: authentication,
+    permission checks, serialization and rendering.
+    """
+
+    def timed_phase(self, request, name):
+        timer = getattr(request, "timer", None)
+        return timer.phase(name) if timer is not None else nullcontext()
+
+    def perform_authentication(self, request):
+        with self.timed_phase(request, "auth"):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with self.timed_phase(request, "permissions"):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with self.timed_phase(request, "permissions"):
+            super().check_object_permissions(request, obj)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        timer = getattr(self.request, "timer", None)
+        if timer is not None:
+            # `.data` calls to_representation, which is where the work happens
+            serializer.to_representation = timer.wrap(
+                "serialization", serializer.to_representation
+            )
+        return serializer
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timer = getattr(request, "timer", None)
+        if timer is not None and hasattr(response, "render"):
+            response.render = timer.wrap("render", response.render)
+        return response
@@ -0,0 +1,163 @@
+"""
+Logging plumbing: a queue handler that writes on a background thread, a JSON
+formatter and a per-logger sampling / rate-limiting filter.
+
+Request threads build the LogRecord, merge its arguments into the message
+and render any traceback before queueing it, so the record no longer refers
+to objects the request may go on to change; JSON encoding and I/O happen on
+the listener thread.
+"""
+
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Queue records for the handlers named in `target_handlers`, which a
+    QueueListener thread feeds.
+
+    The listener starts on the first record in each process, so it also
+    works in forked gunicorn workers, and is flushed by logging.shutdown at
+    exit. When the queue is full, records are dropped and counted rather
+    than blocking the request.
+
+    Configure it with "()" rather than "class": from Python 3.12, dictConfig
+    builds QueueHandler subclasses named by "class" itself, passing only a
+    queue and starting nothing.
+    """
+
+    def __init__(self, target_handlers, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.handler_names = target_handlers
+        self.queue_size = queue_size
+        self.listener = None
+        self.pid = None
+        self.dropped = 0
+
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            # A listener thread inherited through fork isn't running here
+            self.queue = queue.Queue(self.queue_size)
+            handlers = [logging._handlers[name] for name in self.handler_names]
+            self.listener = QueueListener(
+                self.queue, *handlers, respect_handler_level=True
+            )
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def prepare(self, record):
+        """
+        Return a copy of `record` holding only plain values, as
+        QueueHandler.prepare does, but leave the JSON to the listener's
+        formatter rather than formatting the message here.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = (
+                record.exc_text
+                or logging._defaultFormatter.formatException(record.exc_info)
+            )
+        record.exc_info = None
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES and not isinstance(
+                value, (str, int, float, bool, type(None))
+            ):
+                record.__dict__[key] = str(value)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def close(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self.pid = None
+        super().close()
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, including anything passed via `extra`"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.thread,
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Rendered by BackgroundQueueHandler.prepare
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a `sample_rate` fraction of records and at most `rate_limit` per
+    second (0 for no limit).
+
+    Records at `exempt_level` or above always pass. The first record let
+    through after a throttled second carries the number suppressed in it.
+    """
+
+    def __init__(self, sample_rate=1.0, rate_limit=0, exempt_level="WARNING"):
+        super().__init__()
+        self.sample_rate = float(sample_rate)
+        self.rate_limit = int(rate_limit)
+        self.exempt_level = logging.getLevelName(exempt_level)
+        self.window = None
+        self.count = 0
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.exempt_level:
+            return True
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return False
+        if not self.rate_limit:
+            return True
+
+        window = int(time.monotonic())
+        with self._lock:
+            if window != self.window:
+                if self.suppressed:
+                    record.suppressed = self.suppressed
+                self.window, self.count, self.suppressed = window, 0, 0
+            self.count += 1
+            if self.count > self.rate_limit:
+                self.suppressed += 1
+                return False
+        return True
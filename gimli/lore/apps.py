@@ -5,3 +5,6 @@ class LoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "gimli.lore"
     app_label = "lore"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,515 @@
+"""
+Endpoint benchmark suite.
+
+Seeds a dataset of campaigns, players and characters, then drives every
+lore and auth endpoint through the full middleware stack with Django's test
+client, recording latency percentiles and query counts per endpoint.
+Results are checked against the budgets committed in benchmark_budgets.json:
+a query budget is a hard ceiling, a latency budget is a p95 in milliseconds
+that only applies to the dataset the budgets were measured on. The
+worker's cold start has a budget of its own, and the auth dependencies
+that are loaded on first use must stay out of it.
+
+Run it with `python manage.py benchmark`, which works in a throwaway test
+database; gimli/lore/tests.py runs it small to hold the query budgets.
+"""
+
+import contextlib
+import io
+import json
+import math
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from gimli.importtime import profile_startup, startup_time
+
+from .jsonpatch import MERGE_PATCH_MEDIA_TYPE
+from .models import Campaign, Character
+
+User = get_user_model()
+
+BUDGETS_PATH = Path(__file__).with_name("benchmark_budgets.json")
+
+PASSWORD = "benchmark-password"
+
+# Loaded on first use rather than at worker startup: Google's token
+# verification by GoogleLoginView, PyJWT by simplejwt's first token check,
+# and allauth's URLconf (which imports both) lazily by gimli/urls.py
+DEFERRED_MODULES = ("google.auth", "google.oauth2", "jwt", "allauth.urls")
+
+# A private cache, so runs start cold and never touch the configured one.
+# It's per-process, but so is the run, so entries keep their full TTL.
+BENCHMARK_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "gimli-benchmark",
+    }
+}
+BENCHMARK_PROCESS_CACHE_TTL = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """Campaigns owned by the benchmark user, each with its players and characters"""
+
+    campaigns: int = 20
+    players: int = 5
+    characters: int = 10
+
+
+@dataclass
+class Fixture:
+    user: object
+    spare: object
+    campaign: Campaign
+    character: Character
+    characters: list
+    token: str
+    refresh: str
+
+
+@dataclass
+class Scenario:
+    """
+    One endpoint call. `path` and `data` build the request from the fixture
+    and `setup(fixture, client, path)` may return extra headers; all three
+    run untimed before every call.
+    """
+
+    name: str
+    method: str
+    path: Callable
+    data: Callable = None
+    setup: Callable = None
+    status: int = 200
+    content_type: str = "application/json"
+    anonymous: bool = False
+
+
+@dataclass
+class Measurement:
+    name: str
+    method: str
+    path: str
+    expected_status: int
+    statuses: list = field(default_factory=list)
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+
+    def summary(self):
+        return {
+            "method": self.method,
+            "path": self.path,
+            "expected_status": self.expected_status,
+            "statuses": sorted(set(self.statuses)),
+            "iterations": len(self.latencies),
+            "queries": {"min": min(self.queries), "max": max(self.queries)},
+            "latency_ms": {
+                "min": round(min(self.latencies) * 1000, 3),
+                "p50": round(percentile(self.latencies, 50) * 1000, 3),
+                "p90": round(percentile(self.latencies, 90) * 1000, 3),
+                "p95": round(percentile(self.latencies, 95) * 1000, 3),
+                "p99": round(percentile(self.latencies, 99) * 1000, 3),
+                "max": round(max(self.latencies) * 1000, 3),
+                "mean": round(sum(self.latencies) / len(self.latencies) * 1000, 3),
+            },
+        }
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def seed(dataset):
+    """
+    Create the benchmark user, `dataset.players` other users playing in each
+    of its campaigns, and the characters, spread across owner and players.
+    """
+    password = make_password(PASSWORD)
+    user = User.objects.create(
+        username="bench", email="bench@example.com", password=password
+    )
+    players = User.objects.bulk_create(
+        User(username=f"player{i}", email=f"player{i}@example.com", password=password)
+        for i in range(dataset.players)
+    )
+    spare = User.objects.create(
+        username="spare", email="spare@example.com", password=password
+    )
+
+    campaigns = Campaign.objects.bulk_create(
+        Campaign(
+            name=f"Campaign {i}",
+            description=f"The benchmark campaign number {i}",
+            owner=user,
+        )
+        for i in range(dataset.campaigns)
+    )
+    Campaign.players.through.objects.bulk_create(
+        Campaign.players.through(campaign_id=campaign.id, customuser_id=player.id)
+        for campaign in campaigns
+        for player in players
+    )
+
+    owners = [user, *players]
+    Character.objects.bulk_create(
+        Character(
+            name=f"Hero {c}-{i}",
+            bio="A wandering adventurer with a mysterious past",
+            campaign=campaign,
+            owner=owners[i % len(owners)],
+            character_data={"level": i % 20 + 1, "hp": 10 + i, "inventory": []},
+        )
+        for c, campaign in enumerate(campaigns)
+        for i in range(dataset.characters)
+    )
+
+    campaign = campaigns[0]
+    characters = list(Character.objects.filter(campaign=campaign, owner=user))
+    refresh = RefreshToken.for_user(user)
+    return Fixture(
+        user=user,
+        spare=spare,
+        campaign=campaign,
+        character=characters[0],
+        characters=characters,
+        token=str(refresh.access_token),
+        refresh=str(refresh),
+    )
+
+
+def campaign_path(fixture, suffix=""):
+    return f"/api/lore/campaigns/{fixture.campaign.id}/{suffix}"
+
+
+def character_path(fixture, character=None):
+    character = character or fixture.character
+    return campaign_path(fixture, f"characters/{character.id}/")
+
+
+def doomed_campaign_path(fixture):
+    campaign = Campaign.objects.create(name="Doomed", owner=fixture.user)
+    return f"/api/lore/campaigns/{campaign.id}/"
+
+
+def doomed_character_path(fixture):
+    character = Character.objects.create(
+        name="Doomed", campaign=fixture.campaign, owner=fixture.user
+    )
+    return character_path(fixture, character)
+
+
+def clear_caches(fixture, client, path):
+    caches["default"].clear()
+
+
+def current_etag(fixture, client, path):
+    return {"HTTP_IF_NONE_MATCH": client.get(path)["ETag"]}
+
+
+def remove_spare(fixture, client, path):
+    fixture.campaign.players.remove(fixture.spare)
+
+
+def add_spare(fixture, client, path):
+    fixture.campaign.players.add(fixture.spare)
+
+
+# Reads first, so the rows the writes add don't skew them
+SCENARIOS = [
+    # No queries and a trivial view: the middleware stack on its own
+    Scenario("health", "GET", lambda f: "/api/health/"),
+    Scenario("auth.user", "GET", lambda f: "/api/auth/user/"),
+    Scenario(
+        "auth.token",
+        "POST",
+        lambda f: "/api/auth/token/",
+        data=lambda f: {"username": f.user.username, "password": PASSWORD},
+        anonymous=True,
+    ),
+    Scenario(
+        "auth.token_refresh",
+        "POST",
+        lambda f: "/api/auth/token/refresh/",
+        data=lambda f: {"refresh": f.refresh},
+        anonymous=True,
+    ),
+    Scenario(
+        "campaigns.list",
+        "GET",
+        lambda f: "/api/lore/campaigns/",
+        setup=clear_caches,
+    ),
+    Scenario("campaigns.list_cached", "GET", lambda f: "/api/lore/campaigns/"),
+    Scenario(
+        "campaigns.list_fields",
+        "GET",
+        lambda f: "/api/lore/campaigns/?fields=id,name,updated_at",
+        setup=clear_caches,
+    ),
+    Scenario("campaigns.retrieve", "GET", campaign_path),
+    Scenario(
+        "campaigns.retrieve_not_modified",
+        "GET",
+        campaign_path,
+        setup=current_etag,
+        status=304,
+    ),
+    Scenario("characters.list", "GET", lambda f: campaign_path(f, "characters/")),
+    Scenario(
+        "characters.list_compact",
+        "GET",
+        lambda f: campaign_path(f, "characters/?compact=true&expand=owner"),
+    ),
+    Scenario(
+        "characters.list_filtered",
+        "GET",
+        lambda f: campaign_path(f, "characters/?level__gte=5&fields=id,name"),
+    ),
+    Scenario(
+        "characters.list_not_modified",
+        "GET",
+        lambda f: campaign_path(f, "characters/"),
+        setup=current_etag,
+        status=304,
+    ),
+    Scenario("characters.retrieve", "GET", character_path),
+    Scenario("search", "GET", lambda f: "/api/lore/search/?q=hero+wand"),
+    Scenario(
+        "campaigns.create",
+        "POST",
+        lambda f: "/api/lore/campaigns/",
+        data=lambda f: {"name": "New campaign", "description": "Fresh"},
+        status=201,
+    ),
+    Scenario(
+        "campaigns.update",
+        "PATCH",
+        campaign_path,
+        data=lambda f: {"description": "Updated"},
+    ),
+    Scenario(
+        "campaigns.add_player",
+        "POST",
+        lambda f: campaign_path(f, "add_player/"),
+        data=lambda f: {"user_id": f.spare.id},
+        setup=remove_spare,
+    ),
+    Scenario(
+        "campaigns.remove_player",
+        "POST",
+        lambda f: campaign_path(f, "remove_player/"),
+        data=lambda f: {"user_id": f.spare.id},
+        setup=add_spare,
+    ),
+    Scenario("campaigns.destroy", "DELETE", doomed_campaign_path, status=204),
+    Scenario(
+        "characters.create",
+        "POST",
+        lambda f: campaign_path(f, "characters/"),
+        data=lambda f: {"name": "Newcomer", "character_data": {"level": 1}},
+        status=201,
+    ),
+    Scenario(
+        "characters.update",
+        "PATCH",
+        character_path,
+        data=lambda f: {"bio": "Rewritten"},
+    ),
+    Scenario(
+        "characters.merge_patch",
+        "PATCH",
+        character_path,
+        data=lambda f: {"hp": 12, "gold": 3},
+        status=204,
+        content_type=MERGE_PATCH_MEDIA_TYPE,
+    ),
+    Scenario("characters.destroy", "DELETE", doomed_character_path, status=204),
+    Scenario(
+        "characters.bulk_create",
+        "POST",
+        lambda f: campaign_path(f, "characters/bulk/"),
+        data=lambda f: [{"name": f"Recruit {i}"} for i in range(10)],
+        status=201,
+    ),
+    Scenario(
+        "characters.bulk_update",
+        "PATCH",
+        lambda f: campaign_path(f, "characters/bulk/"),
+        data=lambda f: [{"id": ch.id, "age": 30} for ch in f.characters[:10]],
+    ),
+]
+
+
+def measure(scenario, fixture, iterations, warmup):
+    """Call one scenario `warmup` times untimed, then `iterations` times"""
+    if scenario.anonymous:
+        client = Client()
+    else:
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {fixture.token}")
+
+    measurement = None
+    for iteration in range(warmup + iterations):
+        path = scenario.path(fixture)
+        body = "" if scenario.data is None else json.dumps(scenario.data(fixture))
+        headers = scenario.setup(fixture, client, path) if scenario.setup else None
+        started = time.perf_counter()
+        response = client.generic(
+            scenario.method,
+            path,
+            body,
+            content_type=scenario.content_type,
+            **(headers or {}),
+        )
+        elapsed = time.perf_counter() - started
+        if iteration < warmup:
+            continue
+
+        if measurement is None:
+            measurement = Measurement(
+                scenario.name, scenario.method, path, scenario.status
+            )
+        measurement.statuses.append(response.status_code)
+        measurement.latencies.append(elapsed)
+        measurement.queries.append(response.wsgi_request.timer.tracer.count)
+    return measurement
+
+
+def run_suite(dataset=Dataset(), iterations=50, warmup=5, scenarios=None, log=None):
+    """
+    Seed `dataset` into the current database and measure every scenario.
+
+    Returns the per-endpoint summaries, keyed by scenario name.
+    """
+    results = {}
+    with override_settings(
+        CACHES=BENCHMARK_CACHES, LORE_PROCESS_CACHE_TTL=BENCHMARK_PROCESS_CACHE_TTL
+    ):
+        fixture = seed(dataset)
+        for scenario in scenarios or SCENARIOS:
+            # Views still print on some paths
+            with contextlib.redirect_stdout(io.StringIO()):
+                measurement = measure(scenario, fixture, iterations, warmup)
+            results[scenario.name] = measurement.summary()
+            if log is not None:
+                log(scenario.name, results[scenario.name])
+    return results
+
+
+def compare_settings(
+    dataset, variants, iterations=50, warmup=5, scenarios=None, rounds=5
+):
+    """
+    Measure every scenario under each of `variants`, a mapping of name to
+    settings overrides, on one seeded dataset. The variants take turns for
+    `rounds` rounds per scenario, so drift over the run (caches, autovacuum,
+    a busy neighbour) hits all of them alike.
+
+    Returns the per-endpoint summaries keyed by variant, then scenario name.
+    """
+    results = {name: {} for name in variants}
+    per_round = max(math.ceil(iterations / rounds), 1)
+    with override_settings(
+        CACHES=BENCHMARK_CACHES, LORE_PROCESS_CACHE_TTL=BENCHMARK_PROCESS_CACHE_TTL
+    ):
+        fixture = seed(dataset)
+        for scenario in scenarios or SCENARIOS:
+            merged = {}
+            for _ in range(rounds):
+                for name, overrides in variants.items():
+                    with override_settings(**overrides), contextlib.redirect_stdout(
+                        io.StringIO()
+                    ):
+                        measurement = measure(scenario, fixture, per_round, warmup)
+                    if name not in merged:
+                        merged[name] = measurement
+                    else:
+                        merged[name].statuses += measurement.statuses
+                        merged[name].latencies += measurement.latencies
+                        merged[name].queries += measurement.queries
+            for name, measurement in merged.items():
+                results[name][scenario.name] = measurement.summary()
+    return results
+
+
+def measure_startup(repeat=5):
+    """The fastest of `repeat` cold starts, and the deferred modules they load"""
+    profile = profile_startup()
+    return {
+        "wall_ms": round(startup_time(repeat), 3),
+        "modules": len(profile.imports),
+        "deferred_loaded": [name for name in DEFERRED_MODULES if profile.loaded(name)],
+    }
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_budgets(results, budgets, dataset, latency=True, startup=None):
+    """
+    Return the budget violations in `results`, one message each.
+
+    Latency budgets are skipped unless `dataset` is the one they were
+    measured on; statuses and query counts are always checked. `startup`,
+    from measure_startup, is checked against the cold start budget.
+    """
+    violations = []
+    if startup is not None:
+        for name in startup["deferred_loaded"]:
+            violations.append(f"startup: imports {name}, which should load on use")
+        budget = budgets.get("startup", {}).get("wall_ms")
+        if latency and budget is not None and startup["wall_ms"] > budget:
+            violations.append(f"startup: {startup['wall_ms']:.0f}ms, budget {budget}ms")
+
+    latency = latency and budgets.get("dataset") == asdict(dataset)
+    for name, result in results.items():
+        if result["statuses"] != [result["expected_status"]]:
+            violations.append(
+                f"{name}: returned {result['statuses']}, "
+                f"expected {result['expected_status']}"
+            )
+        budget = budgets["endpoints"].get(name)
+        if budget is None:
+            violations.append(f"{name}: no budget")
+            continue
+        if result["queries"]["max"] > budget["queries"]:
+            violations.append(
+                f"{name}: {result['queries']['max']} queries, "
+                f"budget {budget['queries']}"
+            )
+        if latency and result["latency_ms"]["p95"] > budget["p95_ms"]:
+            violations.append(
+                f"{name}: p95 {result['latency_ms']['p95']:.1f}ms, "
+                f"budget {budget['p95_ms']}ms"
+            )
+    return violations
+
+
+def budgets_from(results, dataset, headroom=3, startup=None):
+    """Budgets matching `results`, with `headroom` times the measured p95"""
+    budgets = {
+        "dataset": asdict(dataset),
+        "endpoints": {
+            name: {
+                "queries": result["queries"]["max"],
+                "p95_ms": math.ceil(result["latency_ms"]["p95"] * headroom),
+            }
+            for name, result in sorted(results.items())
+        },
+    }
+    if startup is not None:
+        budgets["startup"] = {"wall_ms": math.ceil(startup["wall_ms"] * headroom)}
+    return budgets
@@ -0,0 +1,129 @@
+import hashlib
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .models import Campaign
+
+
+def cache_timeout(backend, timeout):
+    """
+    `timeout` for an entry in `backend`, capped at LORE_PROCESS_CACHE_TTL
+    when the backend lives in this process: an invalidation made by another
+    worker can't reach it, so its entries may only be that stale.
+    """
+    if isinstance(backend, LocMemCache):
+        return min(timeout, settings.LORE_PROCESS_CACHE_TTL)
+    return timeout
+
+
+class CampaignListCache:
+    """
+    Serialized campaign lists cached per user.
+
+    Every user has a generation counter that is part of the entry key.
+    Invalidating a user bumps the counter once the write commits, which
+    orphans all of their entries (one per query string) at once and means a
+    response computed before the commit can never be stored under the new
+    generation.
+    Generations bumped in a per-process cache stay in that worker, so there
+    entries only live for LORE_PROCESS_CACHE_TTL. Hit/miss counters are kept
+    per process.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[settings.LORE_LIST_CACHE_ALIAS]
+
+    def generation_key(self, user_id):
+        return f"lore:campaign-list-gen:{user_id}"
+
+    def key_for(self, request):
+        user_id = request.user.id
+        # Seeding from the clock means a generation that was culled from the
+        # cache comes back as a new value instead of resurrecting old entries
+        generation = self.backend.get_or_set(
+            self.generation_key(user_id), time.time_ns, None
+        )
+        return self.entry_key(request, generation)
+
+    async def akey_for(self, request):
+        generation = await self.backend.aget_or_set(
+            self.generation_key(request.user.id), time.time_ns, None
+        )
+        return self.entry_key(request, generation)
+
+    def entry_key(self, request, generation):
+        accepted = getattr(request, "accepted_media_type", "")
+        variant = hashlib.sha1(
+            f"{request.get_full_path()}|{accepted}".encode()
+        ).hexdigest()
+        return f"lore:campaign-list:{request.user.id}:{generation}:{variant}"
+
+    def get(self, key):
+        return self.count(self.backend.get(key))
+
+    async def aget(self, key):
+        return self.count(await self.backend.aget(key))
+
+    def count(self, value):
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    @property
+    def timeout(self):
+        return cache_timeout(self.backend, settings.LORE_LIST_CACHE_TTL)
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.timeout)
+
+    async def aset(self, key, value):
+        await self.backend.aset(key, value, self.timeout)
+
+    def invalidate_users(self, user_ids):
+        # Bumped any earlier, a request still reading the rows from before
+        # the write could cache them under the new generation
+        transaction.on_commit(partial(self.bump_generations, set(user_ids)))
+
+    def bump_generations(self, user_ids):
+        for user_id in user_ids:
+            key = self.generation_key(user_id)
+            try:
+                self.backend.incr(key)
+            except ValueError:
+                # No generation yet, so nothing cached for this user
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+campaign_list_cache = CampaignListCache()
+
+
+def campaign_audience(campaign_ids):
+    """Ids of every owner and player of the given campaigns"""
+    user_ids = set()
+    rows = Campaign.objects.filter(pk__in=campaign_ids).values_list(
+        "owner_id", "players"
+    )
+    for owner_id, player_id in rows:
+        user_ids.add(owner_id)
+        if player_id:
+            user_ids.add(player_id)
+    return user_ids
@@ -0,0 +1,202 @@
+import hashlib
+import re
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+# gimli.middleware.APICompressionMiddleware tags compressed bodies with
+# their content-coding; both tags stand for the same state of the resource
+ENCODED_ETAG_SUFFIX = re.compile(r'-(?:br|gzip)"$')
+
+
+def encoded_etag(etag, coding):
+    """The strong tag of the `coding`-compressed body of a response"""
+    return f'{etag[:-1]}-{coding}"'
+
+
+def etag_matches(header, etag, weak=True):
+    """
+    Compare an If-None-Match header against `etag` weakly, or an If-Match
+    header strongly (weak=False), as RFC 9110 requires: a weak tag never
+    satisfies If-Match. Tags of compressed bodies match their original.
+    """
+    etags = [ENCODED_ETAG_SUFFIX.sub('"', tag) for tag in parse_etags(header)]
+    if "*" in etags:
+        return True
+    if not weak:
+        return not etag.startswith("W/") and etag in etags
+    return etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in etags}
+
+
+class ConditionalRequestMixin:
+    """
+    Strong ETags and conditional requests for lore viewsets.
+
+    Detail tags are built from the object's id and `updated_at` plus the
+    `updated_at` of any nested relation listed in `etag_related_fields`.
+    List tags come from one aggregate query over the list's queryset.
+    `If-None-Match` answers 304 before anything is serialized and `If-Match`
+    guards PUT/PATCH with 412, holding a row lock from the check through
+    the write. `alist` and `aretrieve` do the same on top
+    of gimli.async_views.AsyncReadMixin.
+    """
+
+    etag_related_fields = ()
+
+    def make_etag(self, request, version):
+        # The representation also depends on the query string (?fields=,
+        # ?compact=, ?cursor=...) and on the negotiated renderer
+        accepted = getattr(request, "accepted_media_type", "")
+        raw = f"{version!r}|{request.get_full_path()}|{accepted}"
+        return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+    def get_object_version(self, obj):
+        values = [obj.pk, obj.updated_at]
+        for path in self.etag_related_fields:
+            value = obj
+            for attr in path.split("__"):
+                value = getattr(value, attr)
+            values.append(value)
+        return tuple(values)
+
+    def get_detail_version(self, queryset, pk):
+        """Read the version columns of one object without loading the row"""
+        return self.detail_version_queryset(queryset, pk).first()
+
+    async def aget_detail_version(self, queryset, pk):
+        return await self.detail_version_queryset(queryset, pk).afirst()
+
+    def detail_version_queryset(self, queryset, pk):
+        return (
+            queryset.prefetch_related(None)
+            .filter(pk=pk)
+            .values_list("pk", "updated_at", *self.etag_related_fields)
+        )
+
+    def get_list_version(self, queryset):
+        version = (
+            queryset.prefetch_related(None)
+            .order_by()
+            .aggregate(**self.list_version_aggregates())
+        )
+        return (self.request.user.id, tuple(version.values()))
+
+    async def aget_list_version(self, queryset):
+        version = (
+            await queryset.prefetch_related(None)
+            .order_by()
+            .aaggregate(**self.list_version_aggregates())
+        )
+        return (self.request.user.id, tuple(version.values()))
+
+    def list_version_aggregates(self):
+        aggregates = {
+            "count": Count("pk"),
+            "ids": Sum("pk"),
+            "latest": Max("updated_at"),
+        }
+        for path in self.etag_related_fields:
+            aggregates[path] = Max(path)
+        return aggregates
+
+    def not_modified(self, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        return self.add_validators(response, etag)
+
+    def add_validators(self, response, etag):
+        response["ETag"] = etag
+        # Make browsers revalidate instead of reusing another user's copy
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Accept", "Authorization", "Cookie"])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag = self.make_etag(request, self.get_list_version(queryset))
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            return self.not_modified(etag)
+
+        response = super().list(request, *args, **kwargs)
+        return self.add_validators(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Object permissions never deny safe methods here and get_queryset
+        # already scopes what the user can see, so the version query is enough
+        version = self.get_detail_version(
+            self.filter_queryset(self.get_queryset()), kwargs[self.lookup_field]
+        )
+        if version is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = self.make_etag(request, version)
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            return self.not_modified(etag)
+
+        response = super().retrieve(request, *args, **kwargs)
+        return self.add_validators(response, etag)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag = self.make_etag(request, await self.aget_list_version(queryset))
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            return self.not_modified(etag)
+
+        response = await super().alist(request, *args, **kwargs)
+        return self.add_validators(response, etag)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        version = await self.aget_detail_version(
+            self.filter_queryset(self.get_queryset()), kwargs[self.lookup_field]
+        )
+        if version is None:
+            return await super().aretrieve(request, *args, **kwargs)
+
+        etag = self.make_etag(request, version)
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            return self.not_modified(etag)
+
+        response = await super().aretrieve(request, *args, **kwargs)
+        return self.add_validators(response, etag)
+
+    def check_if_match(self, request, obj):
+        """
+        Return a 412 response when If-Match doesn't match `obj`, else None.
+        """
+        if_match = request.headers.get("If-Match")
+        if not if_match:
+            return None
+        etag = self.make_etag(request, self.get_object_version(obj))
+        if etag_matches(if_match, etag, weak=False):
+            return None
+        return self.precondition_failed()
+
+    def precondition_failed(self):
+        return Response(
+            {"detail": "Resource has changed since it was fetched."},
+            status=status.HTTP_412_PRECONDITION_FAILED,
+        )
+
+    def version_filter(self, obj):
+        """Lookups that only match `obj`'s row while its version is unchanged"""
+        fields = ("pk", "updated_at", *self.etag_related_fields)
+        return dict(zip(fields, self.get_object_version(obj)))
+
+    def update(self, request, *args, **kwargs):
+        if not request.headers.get("If-Match"):
+            return super().update(request, *args, **kwargs)
+
+        # Lock the row before reading it, so no other write lands between
+        # the check and this one
+        with transaction.atomic():
+            model = self.get_queryset().model
+            model._base_manager.select_for_update().filter(
+                pk=kwargs[self.lookup_field]
+            ).exists()
+            failed = self.check_if_match(request, self.get_object())
+            if failed is not None:
+                return failed
+            return super().update(request, *args, **kwargs)
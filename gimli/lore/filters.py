@@ -0,0 +1,60 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import ABILITY_FIELDS
+
+RANGE_LOOKUPS = ("gte", "lte", "gt", "lt")
+
+
+class CharacterDataFilter(BaseFilterBackend):
+    """
+    Filters characters on their character_data in Postgres.
+
+    - `level`, `level__gte`, `level__lte`, ... use the generated `level`
+      column and its (campaign, level) index.
+    - `abilities__str__gte=15` and friends do the same with the generated
+      column of each ability score.
+    - `has_key=spells,features` requires top-level keys to exist, with the
+      `?&` operator that the jsonb_ops GIN index on character_data serves.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if view.action != "list":
+            return queryset
+
+        params = request.query_params
+        for name, value in params.items():
+            if name == "level" or name.startswith("level__"):
+                queryset = self.filter_level(queryset, name, value)
+            elif name.startswith("abilities__"):
+                queryset = self.filter_ability(queryset, name, value)
+            elif name == "has_key":
+                keys = [key for key in (k.strip() for k in value.split(",")) if key]
+                if keys:
+                    queryset = queryset.filter(character_data__has_keys=keys)
+        return queryset
+
+    def filter_level(self, queryset, name, value):
+        lookup = name.partition("__")[2]
+        return self.filter_column(queryset, name, "level", lookup, value)
+
+    def filter_ability(self, queryset, name, value):
+        _, ability, lookup = (name.split("__") + [""])[:3]
+        field = ABILITY_FIELDS.get(ability.upper())
+        if field is None:
+            raise ValidationError(
+                {name: f"Ability must be one of {', '.join(ABILITY_FIELDS)}."}
+            )
+        return self.filter_column(queryset, name, field, lookup, value)
+
+    def filter_column(self, queryset, name, field, lookup, value):
+        if lookup and lookup not in RANGE_LOOKUPS:
+            raise ValidationError({name: "Unsupported lookup."})
+        number = self.parse_int(name, value)
+        return queryset.filter(**{f"{field}__{lookup}" if lookup else field: number})
+
+    def parse_int(self, name, value):
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: "A whole number is required."})
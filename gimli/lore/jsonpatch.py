@@ -0,0 +1,243 @@
+"""
+In-database JSON Patch (RFC 6902) and JSON Merge Patch (RFC 7396) for
+Character.character_data.
+
+A patch document is compiled into one SQL expression built from jsonb_set,
+jsonb_insert and the #> / #- operators, so the stored blob is changed by a
+single UPDATE without being read into Python. Each operation is wrapped in a
+scalar subquery that binds the previous result to `d`, which keeps the SQL
+linear in the number of operations. An operation whose precondition fails
+(missing path, failed test, an array index that is out of range or not
+in RFC 6901 form) evaluates to NULL; the NOT NULL constraint on
+character_data then rejects the whole UPDATE.
+"""
+
+import json
+import re
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+JSON_PATCH_MEDIA_TYPE = "application/json-patch+json"
+MERGE_PATCH_MEDIA_TYPE = "application/merge-patch+json"
+
+MAX_OPERATIONS = 100
+
+# RFC 6901 array indexes, and the tokens Postgres reads as array indexes
+ARRAY_INDEX = re.compile(r"0|[1-9][0-9]*")
+POSTGRES_INDEX = re.compile(r"\s*[+-]?[0-9]+")
+
+
+# What JSON and MessagePack renderers can write back out
+INTEGER_RANGE = range(-(2**63), 2**64)
+
+
+def integers_in_range(data):
+    if isinstance(data, dict):
+        return all(integers_in_range(value) for value in data.values())
+    if isinstance(data, list):
+        return all(integers_in_range(value) for value in data)
+    return not isinstance(data, int) or data in INTEGER_RANGE
+
+
+class PatchParser(JSONParser):
+    """
+    JSONParser that rejects integers wider than 64 bits, which jsonb would
+    store but the API could then only render slowly or approximately
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        data = super().parse(stream, media_type, parser_context)
+        if not integers_in_range(data):
+            raise ParseError("JSON parse error - integers must fit in 64 bits.")
+        return data
+
+
+class JSONPatchParser(PatchParser):
+    media_type = JSON_PATCH_MEDIA_TYPE
+
+
+class MergePatchParser(PatchParser):
+    media_type = MERGE_PATCH_MEDIA_TYPE
+
+
+class JSONPatchError(ValueError):
+    """Raised for a patch document that is malformed before it reaches SQL"""
+
+
+def parse_pointer(pointer):
+    """Split an RFC 6901 JSON pointer into its unescaped path tokens"""
+    if not isinstance(pointer, str):
+        raise JSONPatchError("JSON pointers must be strings.")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JSONPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [
+        token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")
+    ]
+
+
+def guard_indexes(sql, params, base, path):
+    """
+    Wrap `sql` so it yields NULL when a token of `path` that RFC 6901 doesn't
+    accept as an array index, but Postgres does ("-1", "01", "+1"), would
+    address an array within `base`.
+    """
+    conditions, guard_params = [], []
+    for depth, token in enumerate(path):
+        if POSTGRES_INDEX.fullmatch(token) and not ARRAY_INDEX.fullmatch(token):
+            conditions.append(
+                f"jsonb_typeof({base} #> %s::text[]) IS DISTINCT FROM 'array'"
+            )
+            guard_params.append(path[:depth])
+    if not conditions:
+        return sql, params
+    return f"CASE WHEN {' AND '.join(conditions)} THEN {sql} END", guard_params + params
+
+
+def add_sql(base, path, value_sql, value_params=()):
+    """
+    SQL for the RFC 6902 `add` of `value_sql` at `path` within `base`.
+
+    Objects get the member set; arrays get the value inserted before the
+    index, which may be at most the array's length, or appended for "-".
+    Any other parent or index yields NULL.
+    """
+    value_params = list(value_params)
+    if not path:
+        return value_sql, value_params
+
+    parent, last = path[:-1], path[-1]
+    if last == "-":
+        array_sql = f"jsonb_insert({base}, %s::text[], {value_sql}, true)"
+        array_params = [parent + ["-1"], *value_params]
+    elif ARRAY_INDEX.fullmatch(last):
+        array_sql = (
+            f"CASE WHEN %s <= jsonb_array_length({base} #> %s::text[]) "
+            f"THEN jsonb_insert({base}, %s::text[], {value_sql}, false) END"
+        )
+        array_params = [int(last), parent, path, *value_params]
+    else:
+        array_sql, array_params = "NULL", []
+    sql = (
+        f"CASE jsonb_typeof({base} #> %s::text[]) "
+        f"WHEN 'object' THEN jsonb_set({base}, %s::text[], {value_sql}, true) "
+        f"WHEN 'array' THEN {array_sql} END"
+    )
+    params = [parent, path, *value_params, *array_params]
+    return guard_indexes(sql, params, base, parent)
+
+
+def compile_operation(operation):
+    """Compile one RFC 6902 operation into SQL over the bound document `d`"""
+    if not isinstance(operation, dict):
+        raise JSONPatchError("Each operation must be an object.")
+
+    op = operation.get("op")
+    path = parse_pointer(operation.get("path"))
+
+    if op in ("add", "replace", "test"):
+        if "value" not in operation:
+            raise JSONPatchError(f"'{op}' operations need a value.")
+        value = json.dumps(operation["value"])
+
+    if op == "add":
+        return add_sql("d", path, "%s::jsonb", [value])
+
+    if op == "replace":
+        if not path:
+            return "%s::jsonb", [value]
+        return guard_indexes(
+            "CASE WHEN d #> %s::text[] IS NOT NULL "
+            "THEN jsonb_set(d, %s::text[], %s::jsonb, false) END",
+            [path, path, value],
+            "d",
+            path,
+        )
+
+    if op == "remove":
+        if not path:
+            raise JSONPatchError("The whole document can't be removed.")
+        return guard_indexes(
+            "CASE WHEN d #> %s::text[] IS NOT NULL THEN d #- %s::text[] END",
+            [path, path],
+            "d",
+            path,
+        )
+
+    if op == "test":
+        return guard_indexes(
+            "CASE WHEN d #> %s::text[] = %s::jsonb THEN d END",
+            [path, value],
+            "d",
+            path,
+        )
+
+    if op in ("copy", "move"):
+        source = parse_pointer(operation.get("from"))
+        if op == "move" and path[: len(source)] == source and path != source:
+            raise JSONPatchError("A value can't be moved into one of its children.")
+        base = "d #- %s::text[]" if op == "move" else "d"
+        inner, inner_params = add_sql("e", path, "v")
+        sql = f"(SELECT {inner} FROM (SELECT {base} AS e, d #> %s::text[] AS v) AS m)"
+        base_params = [source] if op == "move" else []
+        return guard_indexes(sql, inner_params + base_params + [source], "d", source)
+
+    raise JSONPatchError(f"Unsupported operation: {op!r}")
+
+
+def compile_json_patch(column, operations):
+    """
+    Compile an RFC 6902 patch document into (sql, params) that evaluates to
+    the patched value of `column`.
+    """
+    if not isinstance(operations, list):
+        raise JSONPatchError("A JSON Patch document must be a list of operations.")
+    if len(operations) > MAX_OPERATIONS:
+        raise JSONPatchError(f"A patch can hold at most {MAX_OPERATIONS} operations.")
+
+    sql, params = column, []
+    for operation in operations:
+        op_sql, op_params = compile_operation(operation)
+        # The operation's placeholders come before the nested document's
+        sql = f"(SELECT {op_sql} FROM (SELECT {sql} AS d) AS s)"
+        params = op_params + params
+    return sql, params
+
+
+def merge_sql(alias, patch, depth=0):
+    """
+    SQL applying an RFC 7396 merge patch object to the jsonb bound to `alias`.
+
+    Nested objects are merged recursively, each level binding its member to
+    a fresh alias so no expression is repeated.
+    """
+    sql = f"CASE WHEN jsonb_typeof({alias}) = 'object' THEN {alias} ELSE '{{}}' END"
+    params = []
+    for key, value in patch.items():
+        if value is None:
+            sql = f"({sql} - %s)"
+            params = params + [key]
+        elif isinstance(value, dict):
+            child = f"m{depth + 1}"
+            child_sql, child_params = merge_sql(child, value, depth + 1)
+            nested = f"(SELECT {child_sql} FROM (SELECT {alias} -> %s AS {child}) AS s)"
+            sql = f"jsonb_set({sql}, ARRAY[%s], {nested}, true)"
+            params = params + [key] + child_params + [key]
+        else:
+            sql = f"jsonb_set({sql}, ARRAY[%s], %s::jsonb, true)"
+            params = params + [key, json.dumps(value)]
+    return sql, params
+
+
+def compile_merge_patch(column, patch):
+    """
+    Compile an RFC 7396 merge patch into (sql, params) that evaluates to the
+    patched value of `column`.
+    """
+    if not isinstance(patch, dict):
+        # A non-object merge patch replaces the whole document
+        return "%s::jsonb", [json.dumps(patch)]
+    sql, params = merge_sql("m0", patch)
+    return f"(SELECT {sql} FROM (SELECT {column} AS m0) AS s)", params
@@ -0,0 +1,266 @@
+import json
+import platform
+import subprocess
+from contextlib import contextmanager
+from dataclasses import asdict
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from gimli.lore.benchmark import (
+    BUDGETS_PATH,
+    SCENARIOS,
+    Dataset,
+    budgets_from,
+    check_budgets,
+    compare_settings,
+    load_budgets,
+    measure_startup,
+    percentile,
+    run_suite,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every lore and auth endpoint against a seeded test database "
+        "and check the results against the committed budgets."
+    )
+
+    def add_arguments(self, parser):
+        defaults = Dataset()
+        parser.add_argument("--campaigns", type=int, default=defaults.campaigns)
+        parser.add_argument(
+            "--players",
+            type=int,
+            default=defaults.players,
+            help="Players in every campaign",
+        )
+        parser.add_argument(
+            "--characters",
+            type=int,
+            default=defaults.characters,
+            help="Characters in every campaign",
+        )
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--only",
+            action="append",
+            metavar="PREFIX",
+            help="Only run scenarios whose name starts with PREFIX (repeatable)",
+        )
+        parser.add_argument(
+            "--report", metavar="PATH", help="Write the JSON report to PATH"
+        )
+        parser.add_argument(
+            "--baseline",
+            metavar="PATH",
+            help="Compare against the JSON report at PATH",
+        )
+        parser.add_argument("--budgets", default=str(BUDGETS_PATH), metavar="PATH")
+        parser.add_argument(
+            "--update-budgets",
+            action="store_true",
+            help="Rewrite the budgets from this run instead of checking them",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Reuse the test database between runs",
+        )
+        parser.add_argument(
+            "--compare-lean-middleware",
+            action="store_true",
+            help=(
+                "Run the scenarios with API_LEAN_MIDDLEWARE off, then on, and "
+                "report the per-request difference instead of checking budgets"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        dataset = Dataset(
+            campaigns=options["campaigns"],
+            players=options["players"],
+            characters=options["characters"],
+        )
+        if min(asdict(dataset).values()) < 1 or options["iterations"] < 1:
+            raise CommandError("Dataset sizes and --iterations must be positive.")
+
+        scenarios = SCENARIOS
+        if options["only"]:
+            scenarios = [
+                scenario
+                for scenario in SCENARIOS
+                if scenario.name.startswith(tuple(options["only"]))
+            ]
+            if not scenarios:
+                raise CommandError("No scenario matches --only.")
+
+        if options["compare_lean_middleware"]:
+            self.compare_lean_middleware(dataset, scenarios, options)
+            return
+
+        with self.test_databases(options):
+            self.write_header()
+            results = self.run(dataset, scenarios, options)
+        startup = measure_startup()
+        self.stdout.write(
+            f"{'startup':<34}{'':>7}{startup['modules']:>9} modules, "
+            f"{startup['wall_ms']:.0f} ms cold"
+        )
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "dataset": asdict(dataset),
+            "iterations": options["iterations"],
+            "warmup": options["warmup"],
+            "endpoints": results,
+            "startup": startup,
+        }
+
+        if options["update_budgets"]:
+            with open(options["budgets"], "w") as f:
+                json.dump(budgets_from(results, dataset, startup=startup), f, indent=2)
+                f.write("\n")
+            self.stdout.write(f"Budgets written to {options['budgets']}")
+            violations = []
+        else:
+            budgets = load_budgets(options["budgets"])
+            violations = check_budgets(results, budgets, dataset, startup=startup)
+            if budgets.get("dataset") != asdict(dataset):
+                self.stdout.write(
+                    "Dataset differs from the budgets'; checking query counts only."
+                )
+        report["violations"] = violations
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                self.compare(json.load(f), report)
+
+        if options["report"]:
+            with open(options["report"], "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write("\n")
+            self.stdout.write(f"Report written to {options['report']}")
+
+        if violations:
+            for violation in violations:
+                self.stderr.write(violation)
+            raise CommandError(f"{len(violations)} budget violation(s).")
+        self.stdout.write(self.style.SUCCESS("All endpoints within budget."))
+
+    @contextmanager
+    def test_databases(self, options):
+        verbosity = max(options["verbosity"] - 1, 0)
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity, interactive=False, keepdb=options["keepdb"]
+        )
+        try:
+            yield
+        finally:
+            teardown_databases(old_config, verbosity, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+    def run(self, dataset, scenarios, options):
+        if options["keepdb"]:
+            call_command("flush", interactive=False, verbosity=0)
+        return run_suite(
+            dataset,
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+            scenarios=scenarios,
+            log=self.log_result,
+        )
+
+    def write_header(self):
+        self.stdout.write(
+            f"{'endpoint':<34}{'status':>7}{'queries':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        )
+
+    def log_result(self, name, result):
+        latency = result["latency_ms"]
+        statuses = ",".join(str(code) for code in result["statuses"])
+        self.stdout.write(
+            f"{name:<34}{statuses:>7}{result['queries']['max']:>9}"
+            f"{latency['p50']:>9.2f}{latency['p95']:>9.2f}{latency['p99']:>9.2f}"
+        )
+
+    def compare_lean_middleware(self, dataset, scenarios, options):
+        with self.test_databases(options):
+            if options["keepdb"]:
+                call_command("flush", interactive=False, verbosity=0)
+            runs = compare_settings(
+                dataset,
+                {
+                    "full": {"API_LEAN_MIDDLEWARE": False},
+                    "lean": {"API_LEAN_MIDDLEWARE": True},
+                },
+                iterations=options["iterations"],
+                warmup=options["warmup"],
+                scenarios=scenarios,
+            )
+
+        self.stdout.write(
+            f"{'endpoint':<34}{'full p50':>10}{'lean p50':>10}{'saved ms':>10}"
+            f"{'saved':>8}"
+        )
+        savings = []
+        for name, full in runs["full"].items():
+            full_p50 = full["latency_ms"]["p50"]
+            lean_p50 = runs["lean"][name]["latency_ms"]["p50"]
+            saved = full_p50 - lean_p50
+            savings.append(saved)
+            share = saved / full_p50 * 100 if full_p50 else 0
+            self.stdout.write(
+                f"{name:<34}{full_p50:>10.3f}{lean_p50:>10.3f}{saved:>10.3f}"
+                f"{share:>7.0f}%"
+            )
+        self.stdout.write(
+            f"Median saving per request: {percentile(savings, 50):.3f} ms "
+            "(anonymous scenarios always take the full stack)"
+        )
+
+    def compare(self, baseline, report):
+        self.stdout.write(
+            f"\nCompared with {baseline.get('commit') or 'the baseline'}:"
+        )
+        for name, result in report["endpoints"].items():
+            before = baseline.get("endpoints", {}).get(name)
+            if before is None:
+                self.stdout.write(f"{name:<34} new")
+                continue
+            old_p95 = before["latency_ms"]["p95"]
+            new_p95 = result["latency_ms"]["p95"]
+            change = (new_p95 - old_p95) / old_p95 * 100 if old_p95 else 0
+            queries = f"{before['queries']['max']} -> {result['queries']['max']}"
+            self.stdout.write(
+                f"{name:<34}p95 {old_p95:>8.2f} -> {new_p95:>8.2f} ms "
+                f"({change:+.0f}%)  queries {queries}"
+            )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
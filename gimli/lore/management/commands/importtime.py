@@ -0,0 +1,63 @@
+import json
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gimli.importtime import profile_startup, startup_time
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the WSGI application and the URLconf in a fresh interpreter and "
+        "report where the import time goes, by package and by module."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="Rows per table")
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Cold starts to time; the fastest is reported",
+        )
+        parser.add_argument(
+            "--json", metavar="PATH", help="Write every module's timings to PATH"
+        )
+
+    def handle(self, *args, **options):
+        if options["top"] < 1 or options["repeat"] < 1:
+            raise CommandError("--top and --repeat must be positive.")
+        try:
+            profile = profile_startup()
+            wall_ms = startup_time(options["repeat"])
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(
+            f"Cold start: {wall_ms:.0f} ms, {len(profile.imports)} modules "
+            f"({profile.import_ms:.0f} ms of imports under -X importtime)\n"
+        )
+
+        self.stdout.write(f"{'package':<48}{'self ms':>10}")
+        for package, ms in profile.by_package()[: options["top"]]:
+            self.stdout.write(f"{package:<48}{ms:>10.1f}")
+
+        self.stdout.write(f"\n{'module':<48}{'self ms':>10}{'cumul. ms':>11}")
+        for record in profile.slowest(options["top"], cumulative=True):
+            self.stdout.write(
+                f"{record.name:<48}{record.self_us / 1000:>10.1f}"
+                f"{record.cumulative_us / 1000:>11.1f}"
+            )
+
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(
+                    {
+                        "wall_ms": round(wall_ms, 3),
+                        "imports": [asdict(record) for record in profile.imports],
+                    },
+                    f,
+                    indent=2,
+                )
+                f.write("\n")
+            self.stdout.write(f"\nProfile written to {options['json']}")
@@ -0,0 +1,404 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+from gimli.lore.models import Campaign, Character
+
+User = get_user_model()
+
+# Generated rows are spread over the two years before this date
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+SPAN = timedelta(days=730).total_seconds()
+
+ABILITIES = ("STR", "DEX", "CON", "INT", "WIS", "CHA")
+ABILITY_SCORES = range(8, 19)
+SKILLS = (
+    "acrobatics",
+    "arcana",
+    "athletics",
+    "deception",
+    "history",
+    "insight",
+    "intimidation",
+    "investigation",
+    "medicine",
+    "nature",
+    "perception",
+    "persuasion",
+    "religion",
+    "sleight_of_hand",
+    "stealth",
+    "survival",
+)
+EQUIPMENT = (
+    "Longsword",
+    "Shortbow",
+    "Dagger",
+    "Quarterstaff",
+    "Chain mail",
+    "Leather armor",
+    "Shield",
+    "Explorer's pack",
+    "Healing potion",
+    "Thieves' tools",
+    "Holy symbol",
+    "Spellbook",
+)
+SPELLS = (
+    "Fire Bolt",
+    "Mage Hand",
+    "Magic Missile",
+    "Shield",
+    "Cure Wounds",
+    "Healing Word",
+    "Bless",
+    "Misty Step",
+    "Fireball",
+    "Counterspell",
+)
+CASTERS = {"bard", "cleric", "druid", "sorcerer", "warlock", "wizard", "artificer"}
+NAMES = (
+    "Aria", "Borin", "Cael", "Dara", "Eldon", "Fenna", "Garrick", "Hilde",
+    "Ilyra", "Jorin", "Kesh", "Lira", "Merric", "Nyx", "Orsik", "Perrin",
+    "Quill", "Rurik", "Sable", "Thorne", "Ulla", "Vex", "Wren", "Yorra",
+)  # fmt: skip
+WORDS = (
+    "ancient", "shadow", "crown", "river", "forgotten", "dragon", "keep",
+    "storm", "silver", "oath", "ember", "hollow", "tomb", "coast", "frost",
+    "wild", "iron", "veil", "sunken", "court", "mist", "throne", "road",
+)  # fmt: skip
+CLASSES = [value for value, _ in Character.CLASS_CHOICES]
+RACES = [value for value, _ in Character.RACE_CHOICES]
+ALIGNMENTS = [value for value, _ in Character.ALIGNMENT_CHOICES]
+
+
+def between(rng, low, high):
+    """rng.randint, minus the overhead that dominates at millions of rows"""
+    return low + int(rng.random() * (high - low + 1))
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic users, campaigns, players and characters for load "
+        "testing and stream them into Postgres with COPY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--campaigns", type=int, default=20_000)
+        parser.add_argument(
+            "--players",
+            type=int,
+            default=4,
+            help="Average players per campaign",
+        )
+        parser.add_argument(
+            "--characters",
+            type=int,
+            default=6,
+            help="Average characters per campaign",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--password",
+            default="loadtest",
+            help="Password of every generated user",
+        )
+        parser.add_argument(
+            "--keep-indexes",
+            action="store_true",
+            help="Maintain indexes during the load instead of rebuilding them "
+            "after it; faster for small loads into large tables",
+        )
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        if not is_psycopg3:
+            raise CommandError("Streaming COPY requires psycopg 3.")
+        if options["users"] < 1 or options["campaigns"] < 0:
+            raise CommandError("--users must be positive.")
+
+        connection = connections[options["database"]]
+        first_ids = {
+            model: self.next_id(connection, model) for model in (User, Campaign)
+        }
+        generator = SyntheticData(
+            seed=options["seed"],
+            user_ids=range(first_ids[User], first_ids[User] + options["users"]),
+            campaign_ids=range(
+                first_ids[Campaign], first_ids[Campaign] + options["campaigns"]
+            ),
+            players=options["players"],
+            characters=options["characters"],
+            password=make_password(options["password"]),
+        )
+        players = Campaign.players.through
+        models = [User, Campaign, players, Character]
+
+        with transaction.atomic(using=options["database"]):
+            with connection.cursor() as cursor:
+                # Losing the load to a crash is fine; waiting for fsync isn't
+                cursor.execute("SET LOCAL synchronous_commit = off")
+            indexes = []
+            if not options["keep_indexes"]:
+                # Building an index once beats updating it for every row
+                for model in models:
+                    indexes += self.drop_indexes(connection, model)
+
+            self.copy(connection, User, USER_COLUMNS, generator.users())
+            self.copy(connection, Campaign, CAMPAIGN_COLUMNS, generator.campaigns())
+            self.copy(
+                connection,
+                players,
+                ["campaign_id", "customuser_id"],
+                generator.memberships(),
+            )
+            self.copy(connection, Character, CHARACTER_COLUMNS, generator.characters())
+            self.reset_sequences(connection, [User, Campaign])
+
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                # Run the deferred foreign key checks, which CREATE INDEX
+                # refuses to leave pending
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                for definition in indexes:
+                    cursor.execute(definition)
+            if indexes:
+                self.stdout.write(
+                    f"Rebuilt {len(indexes)} indexes "
+                    f"in {time.perf_counter() - started:.1f}s"
+                )
+
+        # Planner statistics for the new volume
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            for model in models:
+                cursor.execute(
+                    f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}"
+                )
+        self.stdout.write(f"Analyzed in {time.perf_counter() - started:.1f}s")
+        self.stdout.write(self.style.SUCCESS("Synthetic data loaded."))
+
+    def drop_indexes(self, connection, model):
+        """
+        Drop the indexes of a table that don't back a constraint and return
+        the statements that recreate them.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT index.relname, pg_get_indexdef(index.oid)
+                FROM pg_index
+                JOIN pg_class index ON index.oid = pg_index.indexrelid
+                WHERE pg_index.indrelid = %s::regclass
+                AND NOT EXISTS (
+                    SELECT 1 FROM pg_constraint
+                    WHERE pg_constraint.conindid = pg_index.indexrelid
+                )
+                """,
+                [model._meta.db_table],
+            )
+            indexes = cursor.fetchall()
+            for name, _ in indexes:
+                cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+        return [definition for _, definition in indexes]
+
+    def next_id(self, connection, model):
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+            return cursor.fetchone()[0]
+
+    def copy(self, connection, model, columns, rows):
+        """Stream `rows` into the model's table with COPY FROM STDIN"""
+        table = connection.ops.quote_name(model._meta.db_table)
+        column_list = ", ".join(connection.ops.quote_name(c) for c in columns)
+        started = time.perf_counter()
+        count = 0
+        with connection.cursor() as cursor:
+            # The psycopg cursor; Django's wrapper has no COPY support
+            with cursor.cursor.copy(f"COPY {table} ({column_list}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    count += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Copied {count:,} rows into {model._meta.db_table} in {elapsed:.1f}s "
+            f"({count / max(elapsed, 1e-9):,.0f} rows/s)"
+        )
+
+    def reset_sequences(self, connection, models):
+        """Move the id sequences past the ids COPY wrote explicitly"""
+        with connection.cursor() as cursor:
+            for model in models:
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f"(SELECT MAX(id) FROM {table}))",
+                    [model._meta.db_table],
+                )
+
+
+USER_COLUMNS = [
+    "id",
+    "password",
+    "is_superuser",
+    "username",
+    "first_name",
+    "last_name",
+    "email",
+    "is_staff",
+    "is_active",
+    "date_joined",
+]
+CAMPAIGN_COLUMNS = [
+    "id",
+    "name",
+    "description",
+    "game_system",
+    "created_at",
+    "updated_at",
+    "owner_id",
+    "is_active",
+]
+# `level`, the ability scores and `search_vector` are generated by Postgres
+CHARACTER_COLUMNS = [
+    "name",
+    "character_class",
+    "race",
+    "age",
+    "alignment",
+    "bio",
+    "campaign_id",
+    "owner_id",
+    "character_data",
+    "created_at",
+    "updated_at",
+]
+
+
+class SyntheticData:
+    """
+    Deterministic row generators for one seed.
+
+    Each campaign's owner, roster and character count come from a random
+    generator seeded with the campaign id, so the membership and character
+    passes agree without holding any of it in memory.
+    """
+
+    def __init__(self, seed, user_ids, campaign_ids, players, characters, password):
+        self.seed = seed
+        self.user_ids = user_ids
+        self.campaign_ids = campaign_ids
+        self.players_per_campaign = players
+        self.characters_per_campaign = characters
+        self.password = password
+
+    def rng(self, *parts):
+        return random.Random(":".join(str(part) for part in (self.seed, *parts)))
+
+    def timestamp(self, rng, after=None):
+        start = after or EPOCH - timedelta(seconds=SPAN)
+        return start + timedelta(seconds=rng.random() * (EPOCH - start).total_seconds())
+
+    def plan(self, campaign_id):
+        """The owner, player ids and character count of a campaign"""
+        rng = self.rng("campaign", campaign_id)
+        owner_id = rng.choice(self.user_ids)
+        size = min(
+            between(rng, 0, 2 * self.players_per_campaign), len(self.user_ids) - 1
+        )
+        player_ids = [
+            user_id
+            for user_id in rng.sample(self.user_ids, size + 1)
+            if user_id != owner_id
+        ][:size]
+        return owner_id, player_ids, between(rng, 0, 2 * self.characters_per_campaign)
+
+    def users(self):
+        rng = self.rng("users")
+        for user_id in self.user_ids:
+            yield (
+                user_id,
+                self.password,
+                False,
+                f"load_{user_id}",
+                rng.choice(NAMES),
+                rng.choice(NAMES) + "son",
+                f"load_{user_id}@example.com",
+                False,
+                True,
+                self.timestamp(rng),
+            )
+
+    def campaigns(self):
+        for campaign_id in self.campaign_ids:
+            owner_id, _, _ = self.plan(campaign_id)
+            rng = self.rng("campaign-row", campaign_id)
+            created_at = self.timestamp(rng)
+            yield (
+                campaign_id,
+                " ".join(rng.sample(WORDS, 3)).title(),
+                " ".join(rng.choices(WORDS, k=between(rng, 8, 40))).capitalize(),
+                rng.choice(("D&D 5e", "D&D 5e", "D&D 5e", "Pathfinder 2e")),
+                created_at,
+                self.timestamp(rng, after=created_at),
+                owner_id,
+                rng.random() < 0.9,
+            )
+
+    def memberships(self):
+        for campaign_id in self.campaign_ids:
+            _, player_ids, _ = self.plan(campaign_id)
+            for player_id in player_ids:
+                yield campaign_id, player_id
+
+    def characters(self):
+        for campaign_id in self.campaign_ids:
+            owner_id, player_ids, count = self.plan(campaign_id)
+            owners = [owner_id, *player_ids]
+            rng = self.rng("characters", campaign_id)
+            for _ in range(count):
+                character_class = rng.choice(CLASSES)
+                created_at = self.timestamp(rng)
+                yield (
+                    f"{rng.choice(NAMES)} {rng.choice(WORDS).title()}",
+                    character_class,
+                    rng.choice(RACES),
+                    between(rng, 16, 300) if rng.random() < 0.8 else None,
+                    rng.choice(ALIGNMENTS),
+                    " ".join(rng.choices(WORDS, k=between(rng, 0, 60))).capitalize(),
+                    campaign_id,
+                    rng.choice(owners),
+                    json.dumps(self.character_data(rng, character_class)),
+                    created_at,
+                    self.timestamp(rng, after=created_at),
+                )
+
+    def character_data(self, rng, character_class):
+        """A character sheet in the shape the frontend edits"""
+        level = min(int(rng.expovariate(0.25)) + 1, 20)
+        hit_points = level * between(rng, 6, 12)
+        sheet = {
+            "abilities": dict(zip(ABILITIES, rng.choices(ABILITY_SCORES, k=6))),
+            "hitPoints": {"max": hit_points, "current": between(rng, 0, hit_points)},
+            "level": level,
+            "proficiencyBonus": 2 + (level - 1) // 4,
+            "armorClass": between(rng, 10, 20),
+            "initiative": between(rng, -1, 5),
+            "speed": rng.choice((25, 30, 30, 35)),
+            "skills": dict.fromkeys(rng.choices(SKILLS, k=4), True),
+            "equipment": ", ".join(rng.sample(EQUIPMENT, between(rng, 1, 5))),
+            "spells": "",
+            "features": "",
+        }
+        if character_class in CASTERS:
+            sheet["spells"] = ", ".join(rng.sample(SPELLS, between(rng, 2, 6)))
+        return sheet
@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .caching import cache_timeout
+from .models import Campaign
+
+
+@dataclass(frozen=True)
+class CampaignAccess:
+    """Who may access a campaign: its owner and the ids of its players"""
+
+    campaign_id: int
+    owner_id: int
+    player_ids: frozenset
+
+    def is_owner(self, user):
+        return user.id == self.owner_id
+
+    def allows(self, user):
+        return self.is_owner(user) or user.id in self.player_ids
+
+
+def campaign_access_cache_key(campaign_id):
+    return f"lore:campaign-access:{campaign_id}"
+
+
+def load_campaign_access(campaign_id):
+    """
+    Load the owner and roster of a campaign in a single query.
+
+    Returns None when the campaign does not exist.
+    """
+    return campaign_access_from_rows(campaign_id, list(access_rows(campaign_id)))
+
+
+async def aload_campaign_access(campaign_id):
+    rows = [row async for row in access_rows(campaign_id)]
+    return campaign_access_from_rows(campaign_id, rows)
+
+
+def access_rows(campaign_id):
+    # From the primary, as the rows are cached (see gimli.db.routers)
+    return (
+        Campaign.objects.using(DEFAULT_DB_ALIAS)
+        .filter(id=campaign_id)
+        .values_list("owner_id", "players")
+    )
+
+
+def campaign_access_from_rows(campaign_id, rows):
+    if not rows:
+        return None
+
+    return CampaignAccess(
+        campaign_id=campaign_id,
+        owner_id=rows[0][0],
+        player_ids=frozenset(player_id for _, player_id in rows if player_id),
+    )
+
+
+def get_campaign_access(request, campaign_id):
+    """
+    Resolve campaign access once per request, backed by the shared cache.
+
+    Entries live for LORE_MEMBERSHIP_CACHE_TTL seconds (LORE_PROCESS_CACHE_TTL
+    in a per-process cache) and are dropped by the signal handlers whenever
+    the owner or roster changes.
+    """
+    campaign_id = int(campaign_id)
+    resolved = resolved_access(request)
+    if campaign_id in resolved:
+        return resolved[campaign_id]
+
+    key = campaign_access_cache_key(campaign_id)
+    access = cache.get(key)
+    if access is None:
+        access = load_campaign_access(campaign_id)
+        if access is not None:
+            cache.set(key, access, membership_cache_timeout())
+
+    resolved[campaign_id] = access
+    return access
+
+
+async def aget_campaign_access(request, campaign_id):
+    """
+    get_campaign_access for async views. Once awaited, the synchronous
+    version finds the result on the request and doesn't query.
+    """
+    campaign_id = int(campaign_id)
+    resolved = resolved_access(request)
+    if campaign_id in resolved:
+        return resolved[campaign_id]
+
+    key = campaign_access_cache_key(campaign_id)
+    access = await cache.aget(key)
+    if access is None:
+        access = await aload_campaign_access(campaign_id)
+        if access is not None:
+            await cache.aset(key, access, membership_cache_timeout())
+
+    resolved[campaign_id] = access
+    return access
+
+
+def membership_cache_timeout():
+    return cache_timeout(
+        caches[DEFAULT_CACHE_ALIAS], settings.LORE_MEMBERSHIP_CACHE_TTL
+    )
+
+
+def resolved_access(request):
+    """The per-request memo of resolved campaign access"""
+    resolved = getattr(request, "_campaign_access", None)
+    if resolved is None:
+        resolved = request._campaign_access = {}
+    return resolved
+
+
+def invalidate_campaign_access(*campaign_ids):
+    cache.delete_many([campaign_access_cache_key(pk) for pk in campaign_ids])
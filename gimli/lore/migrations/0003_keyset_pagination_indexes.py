@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lore', '0002_character'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['updated_at', 'id'], name='lore_campaign_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['owner', 'updated_at', 'id'], name='lore_campaign_owner_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='character',
+            index=models.Index(fields=['campaign', 'updated_at', 'id'], name='lore_character_camp_upd_idx'),
+        ),
+    ]
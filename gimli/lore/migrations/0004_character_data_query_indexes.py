@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:29
+
+import django.contrib.postgres.indexes
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lore', '0003_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='level',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.RawSQL("CASE WHEN jsonb_typeof(character_data -> 'level') = 'number' THEN CASE WHEN abs((character_data ->> 'level')::numeric) < 1000000 THEN (character_data ->> 'level')::numeric::integer END END", []), output_field=models.IntegerField(null=True)),
+        ),
+        migrations.AddIndex(
+            model_name='character',
+            index=models.Index(fields=['campaign', 'level'], name='lore_character_camp_lvl_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='character',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['character_data'], name='lore_character_data_gin', opclasses=['jsonb_path_ops']),
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:52
+
+import django.contrib.postgres.indexes
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lore", "0005_search_vectors"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="character",
+            name="lore_character_data_gin",
+        ),
+        migrations.AddField(
+            model_name="character",
+            name="charisma",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.RawSQL(
+                    "CASE WHEN jsonb_typeof(character_data -> 'abilities' -> 'CHA') = 'number' THEN CASE WHEN abs((character_data -> 'abilities' ->> 'CHA')::numeric) < 1000000 THEN (character_data -> 'abilities' ->> 'CHA')::numeric::integer END END",
+                    [],
+                ),
+                output_field=models.IntegerField(null=True),
+            ),
+        ),
+        migrations.AddField(
+            model_name="character",
+            name="constitution",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.RawSQL(
+                    "CASE WHEN jsonb_typeof(character_data -> 'abilities' -> 'CON') = 'number' THEN CASE WHEN abs((character_data -> 'abilities' ->> 'CON')::numeric) < 1000000 THEN (character_data -> 'abilities' ->> 'CON')::numeric::integer END END",
+                    [],
+                ),
+                output_field=models.IntegerField(null=True),
+            ),
+        ),
+        migrations.AddField(
+            model_name="character",
+            name="dexterity",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.RawSQL(
+                    "CASE WHEN jsonb_typeof(character_data -> 'abilities' -> 'DEX') = 'number' THEN CASE WHEN abs((character_data -> 'abilities' ->> 'DEX')::numeric) < 1000000 THEN (character_data -> 'abilities' ->> 'DEX')::numeric::integer END END",
+                    [],
+                ),
+                output_field=models.IntegerField(null=True),
+            ),
+        ),
+        migrations.AddField(
+            model_name="character",
+            name="intelligence",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.RawSQL(
+                    "CASE WHEN jsonb_typeof(character_data -> 'abilities' -> 'INT') = 'number' THEN CASE WHEN abs((character_data -> 'abilities' ->> 'INT')::numeric) < 1000000 THEN (character_data -> 'abilities' ->> 'INT')::numeric::integer END END",
+                    [],
+                ),
+                output_field=models.IntegerField(null=True),
+            ),
+        ),
+        migrations.AddField(
+            model_name="character",
+            name="strength",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.RawSQL(
+                    "CASE WHEN jsonb_typeof(character_data -> 'abilities' -> 'STR') = 'number' THEN CASE WHEN abs((character_data -> 'abilities' ->> 'STR')::numeric) < 1000000 THEN (character_data -> 'abilities' ->> 'STR')::numeric::integer END END",
+                    [],
+                ),
+                output_field=models.IntegerField(null=True),
+            ),
+        ),
+        migrations.AddField(
+            model_name="character",
+            name="wisdom",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.RawSQL(
+                    "CASE WHEN jsonb_typeof(character_data -> 'abilities' -> 'WIS') = 'number' THEN CASE WHEN abs((character_data -> 'abilities' ->> 'WIS')::numeric) < 1000000 THEN (character_data -> 'abilities' ->> 'WIS')::numeric::integer END END",
+                    [],
+                ),
+                output_field=models.IntegerField(null=True),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="character",
+            index=models.Index(
+                fields=["campaign", "strength"], name="lore_character_camp_str_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="character",
+            index=models.Index(
+                fields=["campaign", "dexterity"], name="lore_character_camp_dex_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="character",
+            index=models.Index(
+                fields=["campaign", "constitution"], name="lore_character_camp_con_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="character",
+            index=models.Index(
+                fields=["campaign", "intelligence"], name="lore_character_camp_int_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="character",
+            index=models.Index(
+                fields=["campaign", "wisdom"], name="lore_character_camp_wis_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="character",
+            index=models.Index(
+                fields=["campaign", "charisma"], name="lore_character_camp_cha_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="character",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["character_data"], name="lore_character_data_gin"
+            ),
+        ),
+    ]
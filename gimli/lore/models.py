@@ -1,9 +1,52 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models.expressions import RawSQL
 from django.contrib.auth import get_user_model
 from django.conf import settings
 
 User = get_user_model()
 
+# Text search configuration baked into the stored search vectors
+SEARCH_CONFIG = "english"
+
+# character_data["abilities"] keys and the generated columns holding them
+ABILITY_FIELDS = {
+    "STR": "strength",
+    "DEX": "dexterity",
+    "CON": "constitution",
+    "INT": "intelligence",
+    "WIS": "wisdom",
+    "CHA": "charisma",
+}
+
+
+def character_data_integer(*path):
+    """
+    A stored generated column holding the number at `path` in
+    character_data. Non-numeric or absurd values become NULL instead of
+    failing the write.
+    """
+    parent = "character_data" + "".join(f" -> '{key}'" for key in path[:-1])
+    value, text = f"{parent} -> '{path[-1]}'", f"{parent} ->> '{path[-1]}'"
+    return models.GeneratedField(
+        expression=RawSQL(
+            f"CASE WHEN jsonb_typeof({value}) = 'number' THEN "
+            f"CASE WHEN abs(({text})::numeric) < 1000000 "
+            f"THEN ({text})::numeric::integer END END",
+            [],
+        ),
+        output_field=models.IntegerField(null=True),
+        db_persist=True,
+    )
+
+
+class LoreManager(models.Manager):
+    """Leaves the stored search vector out of ordinary queries"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer("search_vector")
+
 
 class Campaign(models.Model):
     """
@@ -25,6 +68,26 @@ class Campaign(models.Model):
     )
     is_active = models.BooleanField(default=True)
 
+    # Maintained by Postgres on every write; queried by the search endpoint
+    search_vector = models.GeneratedField(
+        expression=SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="B", config=SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = LoreManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="lore_campaign_search_gin"),
+            # Keyset pagination walks (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="lore_campaign_updated_idx"),
+            models.Index(
+                fields=["owner", "updated_at", "id"], name="lore_campaign_owner_upd_idx"
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -108,9 +171,50 @@ class Character(models.Model):
     # Character sheet data (JSON format)
     character_data = models.JSONField(default=dict, blank=True)
 
+    # Hot keys of character_data, kept in sync by Postgres for indexed filters
+    level = character_data_integer("level")
+    strength = character_data_integer("abilities", "STR")
+    dexterity = character_data_integer("abilities", "DEX")
+    constitution = character_data_integer("abilities", "CON")
+    intelligence = character_data_integer("abilities", "INT")
+    wisdom = character_data_integer("abilities", "WIS")
+    charisma = character_data_integer("abilities", "CHA")
+    search_vector = models.GeneratedField(
+        expression=SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("bio", weight="B", config=SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = LoreManager()
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination walks (updated_at, id) within a campaign
+            models.Index(
+                fields=["campaign", "updated_at", "id"],
+                name="lore_character_camp_upd_idx",
+            ),
+            models.Index(
+                fields=["campaign", "level"], name="lore_character_camp_lvl_idx"
+            ),
+            *(
+                models.Index(
+                    fields=["campaign", field],
+                    name=f"lore_character_camp_{field[:3]}_idx",
+                )
+                for field in ABILITY_FIELDS.values()
+            ),
+            GinIndex(fields=["search_vector"], name="lore_character_search_gin"),
+            # jsonb_ops rather than jsonb_path_ops: only it serves has_key's ?
+            # and ?&. Ranges over scores go through the generated columns,
+            # which no GIN index can narrow.
+            GinIndex(fields=["character_data"], name="lore_character_data_gin"),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.get_character_class_display()}, {self.get_race_display()})"
@@ -0,0 +1,128 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db import models
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in cursor pagination ordered by (updated_at, id), newest first.
+
+    Lists are only paginated when the client sends `page_size` or `cursor`,
+    so existing callers keep receiving a plain array. Each page seeks past
+    the last row of the previous one instead of using OFFSET, so deep pages
+    cost the same as the first.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering = ("-updated_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.get_page_queryset(queryset, request)
+        if page is None:
+            return None
+        return self.set_page(list(page))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page = self.get_page_queryset(queryset, request)
+        if page is None:
+            return None
+        return self.set_page([item async for item in page])
+
+    def get_page_queryset(self, queryset, request):
+        """The unevaluated slice for the requested page, or None"""
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            updated_at, pk = position
+            # The inclusive bound lets Postgres range-scan the composite
+            # index; the OR only has to break ties on equal timestamps.
+            queryset = queryset.filter(updated_at__lte=updated_at).filter(
+                models.Q(updated_at__lt=updated_at) | models.Q(id__lt=pk)
+            )
+
+        # Fetch one extra row to know whether another page exists
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        results = results[: self.page_size]
+        self.last_item = results[-1] if results else None
+        return results
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        default = settings.LORE_PAGE_SIZE
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return default
+        if page_size <= 0:
+            return default
+        return min(page_size, settings.LORE_MAX_PAGE_SIZE)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii")
+            timestamp, pk = raw.split("|", 1)
+            return datetime.fromisoformat(timestamp), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item):
+        raw = f"{item.updated_at.isoformat()}|{item.pk}"
+        return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii").rstrip("=")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last_item)
+        )
+
+    def get_first_link(self):
+        url = self.request.build_absolute_uri()
+        return remove_query_param(url, self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "first": self.get_first_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "first": {"type": "string", "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -5,6 +5,40 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
+def parse_field_list(value):
+    """Split a comma separated query parameter into a set of field names"""
+    if not value:
+        return set()
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Lets clients trim a read serializer with `?fields=` and swap primary keys
+    for nested objects with `?expand=`.
+
+    Only the top-level serializer reacts to the query string; serializers
+    nested as fields are built without a request and keep their fields.
+    """
+
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None:
+            return
+
+        for name in parse_field_list(request.query_params.get("expand")):
+            if name in self.expandable_fields and name in self.fields:
+                self.fields[name] = self.expandable_fields[name](read_only=True)
+
+        requested = parse_field_list(request.query_params.get("fields"))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for user information in campaigns"""
 
@@ -13,7 +47,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ["id", "username", "email", "first_name", "last_name"]
 
 
-class CampaignSerializer(serializers.ModelSerializer):
+class CampaignSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Campaigns"""
 
     owner = UserSerializer(read_only=True)
@@ -45,7 +79,7 @@ class CampaignCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Create a new campaign and set the owner to the current user"""
         request = self.context.get("request")
-        validated_data["owner"] = request.user
+        validated_data["owner_id"] = request.user.id
         return super().create(validated_data)
 
 
@@ -71,7 +105,7 @@ class AddPlayerToCampaignSerializer(serializers.Serializer):
         return value
 
 
-class CharacterSerializer(serializers.ModelSerializer):
+class CharacterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for reading characters"""
 
     owner = UserSerializer(read_only=True)
@@ -106,6 +140,47 @@ class CharacterSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at", "owner"]
 
 
+class CharacterListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Compact serializer for character lists.
+
+    The campaign and owner are sent as ids, since every row in a campaign
+    list shares the same campaign. Use `?expand=campaign,owner` to nest them.
+    """
+
+    expandable_fields = {
+        "campaign": CampaignSerializer,
+        "owner": UserSerializer,
+    }
+
+    character_class_display = serializers.CharField(
+        source="get_character_class_display", read_only=True
+    )
+    race_display = serializers.CharField(source="get_race_display", read_only=True)
+    alignment_display = serializers.CharField(
+        source="get_alignment_display", read_only=True
+    )
+
+    class Meta:
+        model = Character
+        fields = [
+            "id",
+            "name",
+            "character_class",
+            "character_class_display",
+            "race",
+            "race_display",
+            "age",
+            "alignment",
+            "alignment_display",
+            "campaign",
+            "owner",
+            "character_data",
+            "updated_at",
+        ]
+        read_only_fields = fields
+
+
 class CharacterCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating characters"""
 
@@ -127,7 +202,7 @@ class CharacterCreateSerializer(serializers.ModelSerializer):
         campaign_id = self.context.get("campaign_id")
 
         # Set the owner and campaign
-        validated_data["owner"] = request.user
+        validated_data["owner_id"] = request.user.id
         validated_data["campaign_id"] = campaign_id
 
         return super().create(validated_data)
@@ -0,0 +1,83 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import campaign_audience, campaign_list_cache
+from .membership import invalidate_campaign_access
+from .models import Campaign
+
+
+@receiver(pre_save, sender=Campaign)
+def campaign_saving(sender, instance, **kwargs):
+    """Remember the stored owner so an ownership change reaches both users"""
+    instance._previous_owner_id = (
+        Campaign.objects.filter(pk=instance.pk)
+        .values_list("owner_id", flat=True)
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Campaign)
+def campaign_saved(sender, instance, **kwargs):
+    """Drop cached access and list entries whenever a campaign is saved"""
+    invalidate_campaign_access(instance.pk)
+    user_ids = campaign_audience([instance.pk])
+    if instance._previous_owner_id:
+        user_ids.add(instance._previous_owner_id)
+    campaign_list_cache.invalidate_users(user_ids)
+
+
+@receiver(pre_delete, sender=Campaign)
+def campaign_deleting(sender, instance, **kwargs):
+    """Collect the audience while the roster rows still exist"""
+    instance._audience = campaign_audience([instance.pk])
+
+
+@receiver(post_delete, sender=Campaign)
+def campaign_deleted(sender, instance, **kwargs):
+    invalidate_campaign_access(instance.pk)
+    campaign_list_cache.invalidate_users(getattr(instance, "_audience", ()))
+
+
+@receiver(m2m_changed, sender=Campaign.players.through)
+def campaign_players_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate caches and bump updated_at for campaigns whose roster changed"""
+    # clear() doesn't report which rows it removes, so look them up first
+    if action == "pre_clear":
+        if reverse:
+            instance._cleared_roster = (
+                list(instance.campaigns.values_list("id", flat=True)),
+                [instance.pk],
+            )
+        else:
+            instance._cleared_roster = (
+                [instance.pk],
+                list(instance.players.values_list("id", flat=True)),
+            )
+    elif action == "post_clear":
+        roster_changed(*instance._cleared_roster)
+    elif action in ("post_add", "post_remove") and pk_set:
+        # From the user side pk_set holds campaign ids, otherwise user ids
+        if reverse:
+            roster_changed(pk_set, [instance.pk])
+        else:
+            roster_changed([instance.pk], pk_set)
+
+
+def roster_changed(campaign_ids, user_ids):
+    invalidate_campaign_access(*campaign_ids)
+    # The roster is part of the campaign's representation, so its ETag
+    # (built from updated_at) has to move too
+    Campaign.objects.filter(pk__in=campaign_ids).update(updated_at=timezone.now())
+    # Removed players are no longer in the audience, so include them explicitly
+    campaign_list_cache.invalidate_users(
+        campaign_audience(campaign_ids) | set(user_ids)
+    )
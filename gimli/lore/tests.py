@@ -1,3 +1,579 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import logging.config
 
-# Create your tests here.
+from functools import partial
+from unittest import mock
+
+import msgpack
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APITestCase
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from gimli.async_views import AsyncReadMixin, async_read_view
+from gimli.db.routers import primary_pin_key
+from gimli.importtime import profile_startup
+from gimli.spa import bootstrap_script
+from gimli.users.authentication import user_row_cache
+
+from .benchmark import (
+    DEFERRED_MODULES,
+    Dataset,
+    check_budgets,
+    load_budgets,
+    run_suite,
+)
+from .jsonpatch import JSON_PATCH_MEDIA_TYPE, MERGE_PATCH_MEDIA_TYPE
+from .caching import campaign_list_cache
+from .membership import membership_cache_timeout
+from .models import Campaign, Character
+from .views import CharacterViewSet
+
+
+class LoreAPITestCase(APITestCase):
+    """
+    A campaign with one player and their character, and a user outside it.
+    Requests authenticate with a Bearer token, as the frontend's do.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user("owner", "owner@example.com", "pw")
+        cls.player = User.objects.create_user("player", "player@example.com", "pw")
+        cls.outsider = User.objects.create_user("outsider", "out@example.com", "pw")
+        cls.campaign = Campaign.objects.create(
+            name="Curse of Strahd", description="Barovia", owner=cls.owner
+        )
+        cls.campaign.players.add(cls.player)
+        cls.character = Character.objects.create(
+            name="Ireena",
+            campaign=cls.campaign,
+            owner=cls.player,
+            character_data={"level": 3, "abilities": {"str": 12}, "items": ["rope"]},
+        )
+
+    def setUp(self):
+        # Cached memberships and lists outlive each test's transaction
+        cache.clear()
+        self.authenticate(self.player)
+
+    def authenticate(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def characters_url(self, suffix=""):
+        return f"/api/lore/campaigns/{self.campaign.pk}/characters/{suffix}"
+
+    def character_url(self):
+        return self.characters_url(f"{self.character.pk}/")
+
+
+class EndpointBudgetTests(TransactionTestCase):
+    """
+    Run the benchmark suite on a small dataset and hold every endpoint to its
+    committed query budget. Query counts don't depend on the dataset size
+    unless something went N+1, so a few rows per campaign are enough.
+    TransactionTestCase, because a wrapping transaction would add savepoint
+    queries to the writes.
+    """
+
+    def test_endpoints_within_query_budgets(self):
+        dataset = Dataset(campaigns=3, players=2, characters=4)
+        results = run_suite(dataset, iterations=2, warmup=1)
+        violations = check_budgets(results, load_budgets(), dataset, latency=False)
+        self.assertEqual(violations, [])
+
+
+class StartupTests(SimpleTestCase):
+    def test_auth_dependencies_load_on_first_use(self):
+        profile = profile_startup()
+        loaded = [name for name in DEFERRED_MODULES if profile.loaded(name)]
+        self.assertEqual(loaded, [])
+
+
+class LoggingTests(SimpleTestCase):
+    def tearDown(self):
+        logging.config.dictConfig(settings.LOGGING)
+
+    def test_queued_records_reach_the_console(self):
+        logging.config.dictConfig(settings.LOGGING)
+        stream = io.StringIO()
+        logging._handlers["console"].setStream(stream)
+        logger = logging.getLogger("gimli")
+        logger.warning("queued %s", "record")
+        # Arguments and tracebacks are rendered before the request moves on
+        items = ["before"]
+        logger.warning("queued %s", items)
+        items[0] = "after"
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception("failed")
+        # Closing stops the listener once it has drained the queue
+        logging._handlers["queue"].close()
+        output = stream.getvalue()
+        self.assertIn("queued record", output)
+        self.assertIn("queued ['before']", output)
+        self.assertIn("ZeroDivisionError", output)
+
+
+class RenderingTests(LoreAPITestCase):
+    def test_integers_beyond_64_bits(self):
+        response = self.client.patch(
+            self.character_url(),
+            b'{"gold": 100000000000000000000}',
+            content_type=MERGE_PATCH_MEDIA_TYPE,
+        )
+        self.assertEqual(response.status_code, 400)
+
+        # Stored some other way, they still render
+        Character.objects.filter(pk=self.character.pk).update(
+            character_data={"gold": 10**20}
+        )
+        response = self.client.get(self.character_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["character_data"]["gold"], 10**20)
+        response = self.client.get(
+            self.characters_url(), HTTP_ACCEPT="application/msgpack"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            msgpack.unpackb(response.content)[0]["character_data"]["gold"], 1e20
+        )
+
+
+class AuthenticationTests(LoreAPITestCase):
+    def test_inactive_users_are_rejected_once_their_row_expires(self):
+        self.assertEqual(self.client.get(self.characters_url()).status_code, 200)
+        # A queryset update skips the signal that evicts the cached row
+        get_user_model().objects.filter(pk=self.player.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.characters_url()).status_code, 200)
+
+        user_row_cache.clear()
+        response = self.client.get(self.characters_url())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["code"], "user_inactive")
+
+
+class CookieView(AsyncReadMixin, APIView):
+    authentication_classes = []
+    permission_classes = []
+
+    async def aget(self, request):
+        response = Response({"seen": True})
+        response.set_cookie("seen", "1")
+        return response
+
+
+class AsyncReadTests(SimpleTestCase):
+    @override_settings(ASYNC_READS=True)
+    def test_responses_keep_cookies_and_data(self):
+        view = async_read_view(CookieView)
+        request = AsyncRequestFactory().get(
+            "/", headers={"Authorization": "Bearer token"}
+        )
+        response = async_to_sync(view)(request)
+        self.assertEqual(response.cookies["seen"].value, "1")
+        self.assertEqual(response.data, {"seen": True})
+        self.assertEqual(json.loads(response.content), {"seen": True})
+
+
+class ReplicaPinningTests(LoreAPITestCase):
+    # No replica_1 connection exists, so any read routed to it would fail
+    @override_settings(DB_REPLICAS=["replica_1"])
+    def test_bearer_writes_pin_reads_to_the_primary(self):
+        response = self.client.post(
+            self.characters_url(), {"name": "Ismark"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(cache.get(primary_pin_key(self.player.id)))
+
+        self.client.cookies.clear()
+        response = self.client.get(self.characters_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+
+class CacheTimeoutTests(SimpleTestCase):
+    def test_per_process_caches_hold_entries_briefly(self):
+        self.assertEqual(membership_cache_timeout(), settings.LORE_PROCESS_CACHE_TTL)
+        self.assertEqual(campaign_list_cache.timeout, settings.LORE_PROCESS_CACHE_TTL)
+        shared = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(
+                membership_cache_timeout(), settings.LORE_MEMBERSHIP_CACHE_TTL
+            )
+            self.assertEqual(campaign_list_cache.timeout, settings.LORE_LIST_CACHE_TTL)
+
+
+class CampaignListCacheTests(LoreAPITestCase):
+    def test_lists_are_invalidated_when_the_write_commits(self):
+        self.client.get("/api/lore/campaigns/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.campaign.name = "Tomb of Annihilation"
+            self.campaign.save()
+            response = self.client.get("/api/lore/campaigns/")
+            self.assertEqual(response["X-Cache"], "HIT")
+
+        response = self.client.get("/api/lore/campaigns/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data[0]["name"], "Tomb of Annihilation")
+
+
+class MetricsTests(SimpleTestCase):
+    def test_production_requires_a_token(self):
+        with override_settings(IS_PRODUCTION=True, METRICS_TOKEN=""):
+            self.assertEqual(self.client.get("/api/metrics/").status_code, 404)
+        with override_settings(IS_PRODUCTION=True, METRICS_TOKEN="scrape"):
+            self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+            response = self.client.get(
+                "/api/metrics/", HTTP_AUTHORIZATION="Bearer scrape"
+            )
+            self.assertEqual(response.status_code, 200)
+
+
+class JSONPatchTests(LoreAPITestCase):
+    def patch(self, document, media_type=JSON_PATCH_MEDIA_TYPE):
+        return self.client.patch(
+            self.character_url(), json.dumps(document), content_type=media_type
+        )
+
+    def character_data(self):
+        self.character.refresh_from_db()
+        return self.character.character_data
+
+    def test_operations(self):
+        response = self.patch(
+            [
+                {"op": "test", "path": "/level", "value": 3},
+                {"op": "replace", "path": "/level", "value": 4},
+                {"op": "add", "path": "/items/0", "value": "torch"},
+                {"op": "add", "path": "/items/-", "value": "map"},
+                {"op": "add", "path": "/items/3", "value": "rations"},
+                {"op": "remove", "path": "/abilities/str"},
+                {"op": "add", "path": "/abilities/-1", "value": 0},
+            ]
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            self.character_data(),
+            {
+                "level": 4,
+                "abilities": {"-1": 0},
+                "items": ["torch", "rope", "map", "rations"],
+            },
+        )
+
+    def test_merge_patch(self):
+        response = self.patch(
+            {"level": 5, "abilities": {"str": None, "dex": 14}},
+            MERGE_PATCH_MEDIA_TYPE,
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            self.character_data(),
+            {"level": 5, "abilities": {"dex": 14}, "items": ["rope"]},
+        )
+
+    def test_failed_patches_change_nothing(self):
+        original = self.character_data()
+        for document in (
+            [
+                {"op": "replace", "path": "/level", "value": 4},
+                {"op": "test", "path": "/level", "value": 3},
+            ],
+            [{"op": "remove", "path": "/name"}],
+            [{"op": "add", "path": "/items/2", "value": "torch"}],
+            [{"op": "add", "path": "/items/-1", "value": "torch"}],
+            [{"op": "replace", "path": "/items/-1", "value": "torch"}],
+            [{"op": "remove", "path": "/items/00"}],
+            [{"op": "copy", "from": "/items/-1", "path": "/level"}],
+        ):
+            with self.subTest(document=document):
+                self.assertEqual(self.patch(document).status_code, 409)
+        self.assertEqual(self.character_data(), original)
+
+
+class ConditionalRequestTests(LoreAPITestCase):
+    def test_if_none_match(self):
+        etag = self.client.get(self.character_url())["ETag"]
+        response = self.client.get(self.character_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.character_url(), HTTP_IF_NONE_MATCH=f"W/{etag}")
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_match(self):
+        etag = self.client.get(self.character_url())["ETag"]
+        for stale in (f"W/{etag}", '"stale"'):
+            with self.subTest(if_match=stale):
+                response = self.client.patch(
+                    self.character_url(),
+                    {"name": "Ireena Kolyana"},
+                    format="json",
+                    HTTP_IF_MATCH=stale,
+                )
+                self.assertEqual(response.status_code, 412)
+
+        response = self.client.patch(
+            self.character_url(),
+            {"name": "Ireena Kolyana"},
+            format="json",
+            HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(
+            self.character_url(), {"name": "Ireena"}, format="json", HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 412)
+
+    @override_settings(API_COMPRESSION_MIN_SIZE=0)
+    def test_compressed_responses_keep_strong_etags(self):
+        etag = self.client.get(self.character_url())["ETag"]
+        response = self.client.get(self.character_url(), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["ETag"], f'{etag[:-1]}-gzip"')
+        response = self.client.get(
+            self.character_url(), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.patch(
+            self.character_url(),
+            {"name": "Ireena Kolyana"},
+            format="json",
+            HTTP_IF_MATCH=f'{etag[:-1]}-gzip"',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_match_check_and_write_are_atomic(self):
+        etag = self.client.get(self.character_url())["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                self.character_url(),
+                {"name": "Ireena Kolyana"},
+                format="json",
+                HTTP_IF_MATCH=etag,
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any("FOR UPDATE" in query["sql"] for query in queries))
+
+        # Another write lands between the data patch's check and its UPDATE
+        def get_object(view):
+            character = Character.objects.select_related("campaign").get(
+                pk=self.character.pk
+            )
+            Character.objects.filter(pk=character.pk).update(updated_at=timezone.now())
+            return character
+
+        etag = self.client.get(self.character_url())["ETag"]
+        with mock.patch.object(CharacterViewSet, "get_object", get_object):
+            response = self.client.patch(
+                self.character_url(),
+                json.dumps({"level": 4}),
+                content_type=MERGE_PATCH_MEDIA_TYPE,
+                HTTP_IF_MATCH=etag,
+            )
+        self.assertEqual(response.status_code, 412)
+        self.character.refresh_from_db()
+        self.assertEqual(self.character.character_data["level"], 3)
+
+
+class SearchTests(LoreAPITestCase):
+    def test_only_accessible_campaigns_match(self):
+        hidden = Campaign.objects.create(
+            name="Strahd's Revenge", description="Barovia", owner=self.outsider
+        )
+        Character.objects.create(
+            name="Ireena Strahd", campaign=hidden, owner=self.outsider
+        )
+
+        response = self.client.get("/api/lore/search/", {"q": "barov"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [campaign["id"] for campaign in response.data["campaigns"]],
+            [self.campaign.pk],
+        )
+        response = self.client.get("/api/lore/search/", {"q": "iree"})
+        self.assertEqual(
+            [character["id"] for character in response.data["characters"]],
+            [self.character.pk],
+        )
+
+        self.authenticate(self.outsider)
+        response = self.client.get("/api/lore/search/", {"q": "barov"})
+        self.assertEqual(
+            [campaign["id"] for campaign in response.data["campaigns"]], [hidden.pk]
+        )
+
+
+class BulkTests(LoreAPITestCase):
+    def test_one_invalid_item_creates_nothing(self):
+        response = self.client.post(
+            self.characters_url("bulk/"),
+            [{"name": "Ismark"}, {"name": "Rahadin", "race": "vampire"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["valid", "invalid"],
+        )
+        self.assertEqual(Character.objects.filter(campaign=self.campaign).count(), 1)
+
+        response = self.client.post(
+            self.characters_url("bulk/"),
+            [{"name": "Ismark"}, {"name": "Rahadin"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Character.objects.filter(campaign=self.campaign).count(), 3)
+
+    def test_one_forbidden_item_updates_nothing(self):
+        theirs = Character.objects.create(
+            name="Van Richten", campaign=self.campaign, owner=self.owner
+        )
+        response = self.client.patch(
+            self.characters_url("bulk/"),
+            [
+                {"id": self.character.pk, "name": "Ireena Kolyana"},
+                {"id": theirs.pk, "name": "Rictavio"},
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["updated", "forbidden"],
+        )
+        self.character.refresh_from_db()
+        self.assertEqual(self.character.name, "Ireena")
+
+    def test_invalid_ids_are_reported_per_item(self):
+        response = self.client.patch(
+            self.characters_url("bulk/"),
+            [
+                {"id": str(self.character.pk), "name": "Ireena Kolyana"},
+                {"id": "abc", "name": "Rictavio"},
+                {"id": [1]},
+                {"id": {}},
+                {"id": 2**64},
+                {"name": "Rictavio"},
+                "Rictavio",
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        results = response.data["results"]
+        self.assertEqual(results[0]["status"], "updated")
+        for result in results[1:]:
+            self.assertEqual(result["status"], "invalid")
+        self.assertEqual(results[1]["errors"], {"id": ["A valid integer is required."]})
+        self.character.refresh_from_db()
+        self.assertEqual(self.character.name, "Ireena")
+
+
+class CharacterDataFilterTests(LoreAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.fighter = Character.objects.create(
+            name="Ismark",
+            campaign=self.campaign,
+            owner=self.player,
+            character_data={"level": 5, "abilities": {"STR": 16}, "features": []},
+        )
+        self.wizard = Character.objects.create(
+            name="Mordenkainen",
+            campaign=self.campaign,
+            owner=self.player,
+            character_data={"level": 11, "abilities": {"STR": 8}, "spells": []},
+        )
+
+    def names(self, **params):
+        response = self.client.get(self.characters_url(), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(character["name"] for character in response.data)
+
+    def test_filters(self):
+        self.assertEqual(self.names(level=5), ["Ismark"])
+        self.assertEqual(self.names(level__gte=5), ["Ismark", "Mordenkainen"])
+        self.assertEqual(self.names(level__lt=5), ["Ireena"])
+        self.assertEqual(self.names(abilities__str__gte=15), ["Ismark"])
+        self.assertEqual(self.names(abilities__STR=8), ["Mordenkainen"])
+        self.assertEqual(self.names(has_key="spells"), ["Mordenkainen"])
+        self.assertEqual(self.names(has_key="spells,features"), [])
+        self.assertEqual(self.names(has_key="items", level__lte=3), ["Ireena"])
+
+    def test_invalid_filters(self):
+        for params in (
+            {"level": "high"},
+            {"level__in": "1"},
+            {"abilities__luck__gte": "1"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.characters_url(), params)
+                self.assertEqual(response.status_code, 400)
+
+
+class BootstrapTests(LoreAPITestCase):
+    def bootstrap(self, user):
+        request = RequestFactory().get("/campaigns")
+        token = RefreshToken.for_user(user).access_token
+        request.COOKIES[settings.REST_AUTH["JWT_AUTH_COOKIE"]] = str(token)
+        script = bootstrap_script(request).decode()
+        start, end = script.index(">") + 1, script.rindex("</script>")
+        return script[start:end], json.loads(script[start:end])
+
+    def test_payload_is_escaped(self):
+        Campaign.objects.filter(pk=self.campaign.pk).update(
+            name="</script><script>alert(1)</script>"
+        )
+        raw, payload = self.bootstrap(self.owner)
+        self.assertNotIn("<", raw)
+        self.assertEqual(payload["user"]["id"], self.owner.pk)
+        self.assertEqual(
+            payload["campaigns"][0]["name"], "</script><script>alert(1)</script>"
+        )
+
+    def test_campaigns_are_dropped_over_the_size_cap(self):
+        raw, payload = self.bootstrap(self.owner)
+        self.assertEqual(list(payload), ["user", "campaigns"])
+        with override_settings(SPA_BOOTSTRAP_MAX_BYTES=len(raw) - 1):
+            raw, payload = self.bootstrap(self.owner)
+        self.assertEqual(list(payload), ["user"])
+
+
+class LeanMiddlewareTests(LoreAPITestCase):
+    client_class = partial(APIClient, enforce_csrf_checks=True)
+
+    def test_bearer_requests_skip_csrf(self):
+        response = self.client.post(
+            "/api/lore/campaigns/", {"name": "Tomb of Annihilation"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header("X-Frame-Options"))
+
+    def test_session_requests_still_need_csrf(self):
+        self.client.credentials()
+        self.client.force_login(self.player)
+        response = self.client.post(
+            "/api/lore/campaigns/", {"name": "Tomb of Annihilation"}, format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("CSRF", response.data["detail"])
+        self.assertTrue(response.has_header("X-Frame-Options"))
@@ -1,28 +1,55 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CampaignViewSet, CharacterViewSet
+from gimli.async_views import async_read_view
+from .views import CampaignViewSet, CharacterViewSet, SearchView
 
 # Create a router for campaigns
 router = DefaultRouter()
 router.register(r"campaigns", CampaignViewSet, basename="campaign")
 
-# Create URL patterns
+# Create URL patterns. The hot read routes come before the router's so their
+# GETs can be served natively async (see gimli.async_views)
 urlpatterns = [
+    path(
+        "campaigns/",
+        async_read_view(CampaignViewSet, {"get": "list", "post": "create"}),
+        name="campaign-list",
+    ),
+    path(
+        "campaigns/<int:pk>/",
+        async_read_view(
+            CampaignViewSet,
+            {
+                "get": "retrieve",
+                "put": "update",
+                "patch": "partial_update",
+                "delete": "destroy",
+            },
+        ),
+        name="campaign-detail",
+    ),
     path("", include(router.urls)),
+    path("search/", SearchView.as_view(), name="lore-search"),
     path(
         "campaigns/<int:campaign_pk>/characters/",
-        CharacterViewSet.as_view({"get": "list", "post": "create"}),
+        async_read_view(CharacterViewSet, {"get": "list", "post": "create"}),
         name="campaign-characters-list",
     ),
+    path(
+        "campaigns/<int:campaign_pk>/characters/bulk/",
+        CharacterViewSet.as_view({"post": "bulk_create", "patch": "bulk_update"}),
+        name="campaign-characters-bulk",
+    ),
     path(
         "campaigns/<int:campaign_pk>/characters/<int:pk>/",
-        CharacterViewSet.as_view(
+        async_read_view(
+            CharacterViewSet,
             {
                 "get": "retrieve",
                 "put": "update",
                 "patch": "partial_update",
                 "delete": "destroy",
-            }
+            },
         ),
         name="campaign-characters-detail",
     ),
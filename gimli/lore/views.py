@@ -1,19 +1,47 @@
+import re
+
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.settings import api_settings
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.db import models
+from django.http import Http404
+from django.db import DataError, IntegrityError, connection, models, transaction
+from django.db.models.expressions import RawSQL
+from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from .models import Campaign, Character
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from rest_framework.views import APIView
+from gimli.async_views import AsyncReadMixin
+from gimli.db.routers import primary_reads
+from gimli.instrumentation import PhaseTimingMixin
+from .caching import campaign_list_cache
+from .filters import CharacterDataFilter
+from .conditional import ConditionalRequestMixin, etag_matches
+from .jsonpatch import (
+    JSON_PATCH_MEDIA_TYPE,
+    MERGE_PATCH_MEDIA_TYPE,
+    JSONPatchError,
+    JSONPatchParser,
+    MergePatchParser,
+    compile_json_patch,
+    compile_merge_patch,
+)
+from .membership import aget_campaign_access, get_campaign_access
+from .models import SEARCH_CONFIG, Campaign, Character
+from .pagination import KeysetPagination
 from .serializers import (
     CampaignSerializer,
     CampaignCreateSerializer,
     CampaignUpdateSerializer,
     AddPlayerToCampaignSerializer,
     CharacterSerializer,
+    CharacterListSerializer,
     CharacterCreateSerializer,
     CharacterUpdateSerializer,
+    parse_field_list,
 )
 
 User = get_user_model()
@@ -31,7 +59,8 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
 
         # Write permissions are only allowed to the owner of the object.
-        return obj.owner == request.user
+        # Compare ids so the owner row never has to be loaded.
+        return obj.owner_id == request.user.id
 
 
 class IsCampaignOwnerOrPlayer(permissions.BasePermission):
@@ -44,23 +73,20 @@ class IsCampaignOwnerOrPlayer(permissions.BasePermission):
         if not campaign_id:
             return False
 
-        try:
-            campaign = Campaign.objects.get(id=campaign_id)
-            # Allow if user is the campaign owner or a player
-            return (
-                campaign.owner == request.user
-                or campaign.players.filter(id=request.user.id).exists()
-            )
-        except Campaign.DoesNotExist:
-            return False
+        # Allow if user is the campaign owner or a player
+        access = get_campaign_access(request, campaign_id)
+        return access is not None and access.allows(request.user)
 
 
-class CampaignViewSet(viewsets.ModelViewSet):
+class CampaignViewSet(
+    PhaseTimingMixin, ConditionalRequestMixin, AsyncReadMixin, viewsets.ModelViewSet
+):
     """
     ViewSet for viewing and editing campaigns.
     """
 
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """
@@ -70,13 +96,59 @@ class CampaignViewSet(viewsets.ModelViewSet):
         user = self.request.user
         # Return campaigns where user is either owner or player
         # Optimize with select_related and prefetch_related to reduce queries
-        return (
-            Campaign.objects.filter(models.Q(owner=user) | models.Q(players=user))
+        queryset = (
+            Campaign.objects.filter(
+                models.Q(owner_id=user.id) | models.Q(players=user.id)
+            )
             .select_related("owner")
-            .prefetch_related("players")
             .distinct()
         )
 
+        # Skip the players prefetch when ?fields= leaves the roster out
+        requested = parse_field_list(self.request.query_params.get("fields"))
+        if not requested or "players" in requested:
+            queryset = queryset.prefetch_related("players")
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        Serve the campaign list from the per-user cache when possible.
+        """
+        key = campaign_list_cache.key_for(request)
+        cached = campaign_list_cache.get(key)
+        if cached is not None:
+            return self.cached_list_response(request, cached)
+
+        # From the primary, as the response is cached (see gimli.db.routers)
+        with primary_reads():
+            response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            campaign_list_cache.set(key, (response["ETag"], response.data))
+        response["X-Cache"] = "MISS"
+        return response
+
+    async def alist(self, request, *args, **kwargs):
+        key = await campaign_list_cache.akey_for(request)
+        cached = await campaign_list_cache.aget(key)
+        if cached is not None:
+            return self.cached_list_response(request, cached)
+
+        with primary_reads():
+            response = await super().alist(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            await campaign_list_cache.aset(key, (response["ETag"], response.data))
+        response["X-Cache"] = "MISS"
+        return response
+
+    def cached_list_response(self, request, cached):
+        etag, data = cached
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            response = self.not_modified(etag)
+        else:
+            response = self.add_validators(Response(data), etag)
+        response["X-Cache"] = "HIT"
+        return response
+
     def get_serializer_class(self):
         """
         Return appropriate serializer class based on the request.
@@ -105,7 +177,7 @@ class CampaignViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         """Set the owner to the current authenticated user"""
-        serializer.save(owner=self.request.user)
+        serializer.save(owner_id=self.request.user.id)
 
     @action(detail=True, methods=["post"])
     def add_player(self, request, pk=None):
@@ -162,7 +234,9 @@ class CampaignViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class CharacterViewSet(viewsets.ModelViewSet):
+class CharacterViewSet(
+    PhaseTimingMixin, ConditionalRequestMixin, AsyncReadMixin, viewsets.ModelViewSet
+):
     """
     ViewSet for viewing and editing characters within a campaign.
     """
@@ -172,22 +246,63 @@ class CharacterViewSet(viewsets.ModelViewSet):
         IsCampaignOwnerOrPlayer,
         IsOwnerOrReadOnly,
     ]
+    pagination_class = KeysetPagination
+    filter_backends = [CharacterDataFilter]
+    parser_classes = [
+        *api_settings.DEFAULT_PARSER_CLASSES,
+        JSONPatchParser,
+        MergePatchParser,
+    ]
+    # Characters embed their campaign, so its changes must change the ETag
+    etag_related_fields = ("campaign__updated_at",)
 
     def get_queryset(self):
         """
         Return characters for the specified campaign.
         """
         campaign_id = self.kwargs.get("campaign_pk")
-        # If we're in the context of a campaign, filter by that campaign
+        # Patching character_data in place never needs the stored blob
+        if campaign_id and self.is_data_patch():
+            return (
+                Character.objects.filter(campaign_id=campaign_id)
+                .select_related("campaign")
+                .defer("character_data", "bio", "campaign__description")
+            )
+        # Compact lists only join the relations the client asked to expand
+        if campaign_id and self.is_compact():
+            expand = parse_field_list(self.request.query_params.get("expand"))
+            queryset = Character.objects.filter(campaign_id=campaign_id).defer("bio")
+            if "campaign" in expand:
+                queryset = queryset.select_related("campaign__owner").prefetch_related(
+                    "campaign__players"
+                )
+            if "owner" in expand:
+                queryset = queryset.select_related("owner")
+            return queryset
+        # If we're in the context of a campaign, filter by that campaign.
+        # The embedded campaign carries its owner and roster, so load those
+        # up front rather than once per character
         if campaign_id:
-            return Character.objects.filter(campaign_id=campaign_id).select_related(
-                "owner", "campaign"
+            return (
+                Character.objects.filter(campaign_id=campaign_id)
+                .select_related("owner", "campaign__owner")
+                .prefetch_related("campaign__players")
+                .defer("campaign__search_vector")
             )
         # Otherwise return all characters the user has access to
-        return Character.objects.filter(owner=self.request.user).select_related(
-            "campaign"
+        return (
+            Character.objects.filter(owner_id=self.request.user.id)
+            .select_related("owner", "campaign__owner")
+            .prefetch_related("campaign__players")
+            .defer("campaign__search_vector")
         )
 
+    async def aprepare(self, request):
+        # IsCampaignOwnerOrPlayer then finds the access on the request
+        campaign_id = self.kwargs.get("campaign_pk")
+        if campaign_id:
+            await aget_campaign_access(request, campaign_id)
+
     def get_serializer_class(self):
         """
         Return appropriate serializer class based on the request.
@@ -196,8 +311,84 @@ class CharacterViewSet(viewsets.ModelViewSet):
             return CharacterCreateSerializer
         elif self.action in ["update", "partial_update"]:
             return CharacterUpdateSerializer
+        elif self.is_compact():
+            return CharacterListSerializer
         return CharacterSerializer
 
+    def is_compact(self):
+        """
+        Lists opt into the compact representation with ?compact=true.
+        """
+        return self.action == "list" and self.request.query_params.get(
+            "compact", ""
+        ).lower() in ("1", "true")
+
+    def is_data_patch(self):
+        """
+        PATCH with a JSON Patch or merge patch body edits only character_data.
+        """
+        return self.action == "partial_update" and self.get_media_type() in (
+            JSON_PATCH_MEDIA_TYPE,
+            MERGE_PATCH_MEDIA_TYPE,
+        )
+
+    def get_media_type(self):
+        return self.request.content_type.split(";")[0].strip().lower()
+
+    def partial_update(self, request, *args, **kwargs):
+        """
+        Apply an RFC 6902 JSON Patch or RFC 7396 merge patch to character_data
+        with a single UPDATE, or fall back to a regular partial update.
+
+        Patch pointers are relative to character_data. A successful patch
+        returns 204 with the new ETag, since sending the sheet back would
+        defeat the purpose.
+        """
+        if not self.is_data_patch():
+            return super().partial_update(request, *args, **kwargs)
+
+        character = self.get_object()
+        failed = self.check_if_match(request, character)
+        if failed is not None:
+            return failed
+
+        column = connection.ops.quote_name("character_data")
+        try:
+            if self.get_media_type() == JSON_PATCH_MEDIA_TYPE:
+                sql, params = compile_json_patch(column, request.data)
+            else:
+                sql, params = compile_merge_patch(column, request.data)
+        except JSONPatchError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Under If-Match, only write the version that was just checked
+        if_match = bool(request.headers.get("If-Match"))
+        if if_match:
+            target = self.version_filter(character)
+        else:
+            target = {"pk": character.pk}
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                updated = Character.objects.filter(**target).update(
+                    character_data=RawSQL(sql, params), updated_at=now
+                )
+        except (DataError, IntegrityError):
+            # A failed test, a missing path or a type mismatch
+            return Response(
+                {"detail": "The patch could not be applied to character_data."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if not updated:
+            if if_match:
+                return self.precondition_failed()
+            raise Http404
+
+        character.updated_at = now
+        response = Response(status=status.HTTP_204_NO_CONTENT)
+        response["ETag"] = self.make_etag(request, self.get_object_version(character))
+        return response
+
     def get_serializer_context(self):
         """
         Add campaign_id to serializer context.
@@ -211,5 +402,195 @@ class CharacterViewSet(viewsets.ModelViewSet):
         Create a new character with the current user as owner.
         """
         serializer.save(
-            owner=self.request.user, campaign_id=self.kwargs.get("campaign_pk")
+            owner_id=self.request.user.id, campaign_id=self.kwargs.get("campaign_pk")
+        )
+
+    def bulk_create(self, request, *args, **kwargs):
+        """
+        Create a batch of characters with one permission check and one
+        transaction.
+
+        Every item is validated before anything is written; if any item is
+        invalid nothing is created and the per-item errors are returned.
+        """
+        items, error = self.get_bulk_items(request)
+        if error:
+            return error
+
+        context = self.get_serializer_context()
+        results = []
+        valid = []
+        for index, item in enumerate(items):
+            serializer = CharacterCreateSerializer(data=item, context=context)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+                results.append({"index": index, "status": "valid"})
+            else:
+                results.append(
+                    {"index": index, "status": "invalid", "errors": serializer.errors}
+                )
+
+        if len(valid) != len(items):
+            return Response({"results": results}, status=status.HTTP_400_BAD_REQUEST)
+
+        characters = [
+            Character(
+                owner_id=request.user.id,
+                campaign_id=self.kwargs.get("campaign_pk"),
+                **validated_data,
+            )
+            for validated_data in valid
+        ]
+        with transaction.atomic():
+            Character.objects.bulk_create(
+                characters, batch_size=settings.LORE_BULK_BATCH_SIZE
+            )
+
+        results = [
+            {"index": index, "status": "created", "id": character.pk}
+            for index, character in enumerate(characters)
+        ]
+        return Response({"results": results}, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request, *args, **kwargs):
+        """
+        Partially update a batch of characters, given as objects with an `id`,
+        in one transaction.
+
+        Only characters owned by the current user can be changed. If any
+        item is missing, forbidden or invalid nothing is written.
+        """
+        items, error = self.get_bulk_items(request)
+        if error:
+            return error
+
+        ids = [self.get_bulk_item_id(item) for item in items]
+        characters = Character.objects.filter(
+            campaign_id=self.kwargs.get("campaign_pk"),
+            id__in=[pk for pk in ids if isinstance(pk, int)],
+        ).in_bulk()
+
+        context = self.get_serializer_context()
+        results = []
+        changed = []
+        fields = {"updated_at"}
+        for index, (item, pk) in enumerate(zip(items, ids)):
+            if not isinstance(pk, int):
+                results.append({"index": index, "status": "invalid", "errors": pk})
+                continue
+            character = characters.get(pk)
+            if character is None:
+                results.append({"index": index, "status": "not_found"})
+                continue
+            if character.owner_id != request.user.id:
+                results.append({"index": index, "status": "forbidden"})
+                continue
+
+            serializer = CharacterUpdateSerializer(
+                character, data=item, partial=True, context=context
+            )
+            if not serializer.is_valid():
+                results.append(
+                    {"index": index, "status": "invalid", "errors": serializer.errors}
+                )
+                continue
+
+            for field, value in serializer.validated_data.items():
+                setattr(character, field, value)
+            fields.update(serializer.validated_data)
+            changed.append(character)
+            results.append({"index": index, "status": "updated", "id": character.pk})
+
+        if len(changed) != len(items):
+            return Response({"results": results}, status=status.HTTP_400_BAD_REQUEST)
+
+        # bulk_update() skips auto_now, so stamp updated_at ourselves
+        now = timezone.now()
+        for character in changed:
+            character.updated_at = now
+        with transaction.atomic():
+            Character.objects.bulk_update(
+                changed, sorted(fields), batch_size=settings.LORE_BULK_BATCH_SIZE
+            )
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    def get_bulk_item_id(self, item):
+        """
+        Return the integer `id` of a bulk update item, or its errors.
+        """
+        if not isinstance(item, dict):
+            return {"non_field_errors": ["Expected an object."]}
+        if "id" not in item:
+            return {"id": ["This field is required."]}
+        pk = item["id"]
+        if isinstance(pk, str) and pk.isascii() and pk.isdigit():
+            pk = int(pk)
+        if isinstance(pk, bool) or not isinstance(pk, int) or not 0 < pk < 2**63:
+            return {"id": ["A valid integer is required."]}
+        return pk
+
+    def get_bulk_items(self, request):
+        """
+        Return the list of items in a bulk request, or an error response.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return None, Response(
+                {"detail": "Expected a non-empty list of characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > settings.LORE_BULK_MAX_ITEMS:
+            return None, Response(
+                {
+                    "detail": f"A batch can hold at most "
+                    f"{settings.LORE_BULK_MAX_ITEMS} characters."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return items, None
+
+
+class SearchView(PhaseTimingMixin, APIView):
+    """
+    Ranked full-text search over the campaigns and characters the user can
+    access.
+
+    Every word of `q` is matched as a prefix, so partial input works for
+    type-ahead. Matching and ranking happen against the stored search
+    vectors; only ids, names and ranks come back from Postgres.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        words = re.findall(r"\w+", request.query_params.get("q", ""))
+        if not words:
+            return Response({"campaigns": [], "characters": []})
+
+        query = SearchQuery(
+            " & ".join(f"{word}:*" for word in words),
+            search_type="raw",
+            config=SEARCH_CONFIG,
+        )
+        rank = SearchRank(models.F("search_vector"), query)
+        limit = settings.LORE_SEARCH_LIMIT
+
+        user_id = request.user.id
+        accessible = Campaign.objects.filter(
+            models.Q(owner_id=user_id) | models.Q(players=user_id)
+        ).values("id")
+
+        campaigns = (
+            Campaign.objects.filter(id__in=accessible, search_vector=query)
+            .annotate(rank=rank)
+            .order_by("-rank", "-id")
+            .values("id", "name", "rank")[:limit]
+        )
+        characters = (
+            Character.objects.filter(campaign_id__in=accessible, search_vector=query)
+            .annotate(rank=rank)
+            .order_by("-rank", "-id")
+            .values("id", "name", "campaign_id", "rank")[:limit]
         )
+        return Response({"campaigns": list(campaigns), "characters": list(characters)})
@@ -0,0 +1,149 @@
+"""
+Prometheus metrics for HTTP requests.
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py) makes
+prometheus_client keep each worker's values in mmap-backed files, which the
+metrics view sums on every scrape. Without it (runserver, tests) values live
+in process memory.
+"""
+
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_DURATION = Histogram(
+    "gimli_http_request_duration_seconds",
+    "Time spent handling a request, by route.",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    "gimli_http_request_db_queries",
+    "Database queries issued by a request, by route.",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REQUEST_PHASES = Histogram(
+    "gimli_http_request_phase_seconds",
+    "Time spent in each phase of a request (auth, permissions, queryset, "
+    "serialization, render), by route.",
+    ["method", "route", "phase"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+RESPONSES = Counter(
+    "gimli_http_responses",
+    "Responses sent, by route and status code.",
+    ["method", "route", "status"],
+)
+IN_FLIGHT = Gauge(
+    "gimli_http_requests_in_flight",
+    "Requests currently being handled.",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "gimli_db_pool_connections",
+    "Connections in the database pool, by state (size, available, max).",
+    ["alias", "state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAITING = Gauge(
+    "gimli_db_pool_requests_waiting",
+    "Checkouts currently waiting for a pooled connection.",
+    ["alias"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter(
+    "gimli_db_pool_checkouts",
+    "Connections checked out of the pool, and how many had to queue.",
+    ["alias", "outcome"],
+)
+DB_POOL_WAIT = Counter(
+    "gimli_db_pool_wait_seconds",
+    "Time spent waiting for a pooled connection.",
+    ["alias"],
+)
+DB_POOL_ERRORS = Counter(
+    "gimli_db_pool_errors",
+    "Checkout timeouts, broken connections returned and connections lost.",
+    ["alias", "kind"],
+)
+
+# Pool statistics are copied into the metrics at most this often per process
+POOL_STATS_INTERVAL = 1.0
+_pool_stats_at = 0.0
+
+
+def route_for(request):
+    """The matched URL pattern, which keeps label cardinality bounded"""
+    match = getattr(request, "resolver_match", None)
+    return match.route if match is not None else "unmatched"
+
+
+def record_request(request, response, duration, query_count, phases):
+    method = request.method
+    route = route_for(request)
+    REQUEST_DURATION.labels(method, route).observe(duration)
+    RESPONSES.labels(method, route, str(response.status_code)).inc()
+    REQUEST_QUERIES.labels(method, route).observe(query_count)
+    for phase, seconds in phases.items():
+        REQUEST_PHASES.labels(method, route, phase).observe(seconds)
+
+    global _pool_stats_at
+    now = time.monotonic()
+    if now - _pool_stats_at >= POOL_STATS_INTERVAL:
+        _pool_stats_at = now
+        record_pool_stats()
+
+
+def record_pool_stats():
+    for conn in connections.all(initialized_only=True):
+        pool = getattr(conn, "pool", None)
+        if pool is None:
+            continue
+        # pop_stats() resets the counters, so they are added as deltas
+        stats = pool.pop_stats()
+        alias = conn.alias
+        DB_POOL_CONNECTIONS.labels(alias, "size").set(stats.get("pool_size", 0))
+        DB_POOL_CONNECTIONS.labels(alias, "available").set(
+            stats.get("pool_available", 0)
+        )
+        DB_POOL_CONNECTIONS.labels(alias, "max").set(stats.get("pool_max", 0))
+        DB_POOL_WAITING.labels(alias).set(stats.get("requests_waiting", 0))
+        DB_POOL_CHECKOUTS.labels(alias, "total").inc(stats.get("requests_num", 0))
+        DB_POOL_CHECKOUTS.labels(alias, "queued").inc(stats.get("requests_queued", 0))
+        DB_POOL_WAIT.labels(alias).inc(stats.get("requests_wait_ms", 0) / 1000)
+        DB_POOL_ERRORS.labels(alias, "timeout").inc(stats.get("requests_errors", 0))
+        DB_POOL_ERRORS.labels(alias, "returned_bad").inc(stats.get("returns_bad", 0))
+        DB_POOL_ERRORS.labels(alias, "lost").inc(stats.get("connections_lost", 0))
+
+
+def metrics_view(request):
+    """Prometheus text exposition, summed over every worker process"""
+    if settings.METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not constant_time_compare(supplied, settings.METRICS_TOKEN):
+            return HttpResponseForbidden()
+    elif settings.IS_PRODUCTION:
+        # Traffic, error rates and pool stats are never public in production
+        raise Http404
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
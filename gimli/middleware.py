@@ -1,21 +1,191 @@
+import base64
+import functools
+import gzip
+import json
 import logging
+import os
+import random
+import re
+import sys
 import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
 from django.http import JsonResponse
 from django.conf import settings
 import time
-from django.db import connection, reset_queries
+import brotli
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.middleware import clickjacking, csrf
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware
+from gimli.db.routers import (
+    ais_pinned_to_primary,
+    apin_to_primary,
+    is_pinned_to_primary,
+    pin_to_primary,
+    replica_reads,
+)
+from gimli.lore.conditional import encoded_etag
+from gimli.metrics import IN_FLIGHT, record_request
+
+# `name-<8 character hash>.ext`, as Vite names its build output
+VITE_HASHED_NAME = re.compile(r"-[A-Za-z0-9_-]{8}\.\w+$")
 
 logger = logging.getLogger("django.request")
+sql_logger = logging.getLogger("django.db.backends")
 
 
-class ErrorLoggingMiddleware:
+class AsyncCapableMiddleware:
+    """
+    Base for middleware that runs natively in both WSGI and ASGI stacks, so
+    an async view isn't pushed onto a thread by a sync middleware above it.
+
+    As with Django's MiddlewareMixin, the instance becomes a coroutine
+    function when the rest of the chain is async; subclasses implement
+    `__acall__` next to `__call__`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can sit in an async middleware stack. Looking a file up
+    is an in-memory dict hit, so only requests it doesn't serve reach the
+    (awaited) rest of the chain.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+    def immutable_file_test(self, path, url):
+        # Besides Django's hashed static files, Vite's build output, which
+        # carries a content hash in every name under assets/
+        if super().immutable_file_test(path, url):
+            return True
+        root = getattr(settings, "WHITENOISE_ROOT", None)
+        return bool(
+            root
+            and path.startswith(os.path.join(root, "assets", ""))
+            and VITE_HASHED_NAME.search(url)
+        )
+
+
+class APICompressionMiddleware(AsyncCapableMiddleware):
+    """
+    Compress /api/ responses of at least API_COMPRESSION_MIN_SIZE bytes with
+    brotli or gzip, whichever the client's Accept-Encoding prefers.
+
+    Brotli runs at a low quality, which is about as fast as gzip and still
+    smaller. Strong ETags stay strong but gain the content-coding (`"…-br"`),
+    as the compressed body is a different representation; If-None-Match and
+    If-Match accept either tag (see gimli.lore.conditional.etag_matches).
+    """
 
     def __call__(self, request):
-        response = self.get_response(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if (
+            not request.path.startswith("/api/")
+            or response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < settings.API_COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = preferred_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding == "br":
+            content = brotli.compress(
+                response.content, quality=settings.API_BROTLI_QUALITY
+            )
+        elif encoding == "gzip":
+            content = gzip.compress(
+                response.content, compresslevel=settings.API_GZIP_LEVEL, mtime=0
+            )
+        else:
+            return response
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response["Content-Length"] = str(len(content))
+        response["Content-Encoding"] = encoding
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = encoded_etag(etag, encoding)
         return response
 
+
+def preferred_encoding(accept_encoding):
+    """`br`, `gzip` or None, by the q-values in an Accept-Encoding header"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+
+    wildcard = weights.get("*", 0.0)
+    choices = [
+        (weights.get(coding, wildcard), preference, coding)
+        for preference, coding in enumerate(("gzip", "br"))
+    ]
+    quality, _, coding = max(choices)
+    return coding if quality > 0 else None
+
+
+class ErrorLoggingMiddleware(AsyncCapableMiddleware):
+
     def process_exception(self, request, exception):
         """Log the exception and provide more details about what failed"""
         # Get the full traceback
@@ -33,13 +203,16 @@ class ErrorLoggingMiddleware:
         return None  # Let Django's default error handling proceed
 
 
-class SecurityHeadersMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
-
+class SecurityHeadersMiddleware(AsyncCapableMiddleware):
     def __call__(self, request):
-        response = self.get_response(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.add_headers(self.get_response(request))
 
+    async def __acall__(self, request):
+        return self.add_headers(await self.get_response(request))
+
+    def add_headers(self, response):
         # Only apply security headers in production
         if settings.IS_PRODUCTION:
             # Required for Google Sign-In popups to work properly
@@ -56,86 +229,420 @@ class SecurityHeadersMiddleware:
         return response
 
 
-class RequestTimingMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        # Start timing
-        start_time = time.time()
+def is_token_api_request(request):
+    """
+    A Bearer-token /api/ call without a session cookie. DRF authenticates
+    it from the header alone, so it needs no user from the session, CSRF
+    check, messages or clickjacking header.
+    """
+    return (
+        settings.API_LEAN_MIDDLEWARE
+        and request.path_info.startswith("/api/")
+        and request.META.get("HTTP_AUTHORIZATION", "").startswith("Bearer ")
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
 
-        # Process the request
-        response = self.get_response(request)
 
-        # Calculate duration
-        duration = time.time() - start_time
+class TokenAPIBypassMixin:
+    """
+    Hand token API requests straight to the next middleware. Mixed into
+    the session-stack middleware below, which replace Django's in
+    MIDDLEWARE; being subclasses, they still satisfy the admin's checks.
+    """
 
-        # Log if request is slow (over 200ms)
-        if duration > 0.2:
-            logger.warning(
-                f"SLOW REQUEST: {request.method} {request.path} took {duration*1000:.2f}ms"
-            )
+    def __call__(self, request):
+        if is_token_api_request(request):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class CsrfViewMiddleware(TokenAPIBypassMixin, csrf.CsrfViewMiddleware):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        # The handler calls view hooks directly, past __call__
+        if is_token_api_request(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class AuthenticationMiddleware(
+    TokenAPIBypassMixin, auth_middleware.AuthenticationMiddleware
+):
+    pass
+
+
+class MessageMiddleware(TokenAPIBypassMixin, messages_middleware.MessageMiddleware):
+    pass
+
+
+class XFrameOptionsMiddleware(
+    TokenAPIBypassMixin, clickjacking.XFrameOptionsMiddleware
+):
+    pass
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"IN \((?:\?(?:, )?)+\)")
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def fingerprint(sql):
+    """
+    Normalize a statement to its shape: literals become ?, IN lists collapse.
+    """
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def find_call_site():
+    """Return "file:line in function" for the innermost frame of our own code"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PROJECT_DIR) and filename != __file__:
+            relative = os.path.relpath(filename, settings.BASE_DIR)
+            return f"{relative}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class QueryTracer:
+    """
+    Counts and times the queries of one request from an execute wrapper, so
+    it works with DEBUG off.
+
+    With a `threshold`, statements are also grouped by their SQL text, which
+    Django keeps parameterized, and when one statement reaches the threshold
+    the tracer records where in our code it was issued.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+        self.call_sites = {}
+        self.first = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if len(self.first) < 5:
+                self.first.append((elapsed, sql))
+            if self.threshold:
+                seen = self.statements.get(sql, 0) + 1
+                self.statements[sql] = seen
+                if seen == self.threshold:
+                    self.call_sites[sql] = find_call_site()
+            # With DEBUG off Django doesn't log statements itself
+            conn = context["connection"]
+            if not conn.queries_logged and sql_logger.isEnabledFor(logging.DEBUG):
+                sql_logger.debug(
+                    "(%.3f) %s; args=%s; alias=%s",
+                    elapsed,
+                    sql,
+                    params,
+                    conn.alias,
+                    extra={
+                        "duration": elapsed,
+                        "sql": sql,
+                        "params": params,
+                        "alias": conn.alias,
+                    },
+                )
+
+    def repeated_statements(self):
+        """
+        Yield (count, fingerprint, call_site) for statement shapes issued at
+        least `threshold` times.
+        """
+        shapes = {}
+        for sql, seen in self.statements.items():
+            shape = fingerprint(sql)
+            count, call_site = shapes.get(shape, (0, None))
+            shapes[shape] = (count + seen, call_site or self.call_sites.get(sql))
+        for shape, (count, call_site) in shapes.items():
+            if count >= self.threshold:
+                yield count, shape, call_site or "unknown"
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Let safe-method requests read from replicas (see gimli.db.routers),
+    unless the client wrote within the last DB_REPLICA_PIN_SECONDS.
+
+    Unsafe requests read from the primary and pin the client's reads there
+    until replicas have caught up with the write: with a short-lived
+    cookie, and for Bearer-token clients, which needn't keep cookies, by
+    the token's user id. Token claims are read unverified here; they only
+    route reads, and a write pins only once DRF accepted the token.
+    """
+
+    cookie_name = "db_primary_pin"
+    safe_methods = ("GET", "HEAD", "OPTIONS")
 
-        # Add timing header to response
-        response["X-Request-Time"] = f"{duration*1000:.2f}ms"
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        user_id = self.token_user_id(request)
+        token = replica_reads.set(
+            self.can_use_replica(request)
+            and not (user_id and is_pinned_to_primary(user_id))
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+        if user_id and self.pins_user(request, response):
+            pin_to_primary(user_id)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        user_id = self.token_user_id(request)
+        token = replica_reads.set(
+            self.can_use_replica(request)
+            and not (user_id and await ais_pinned_to_primary(user_id))
+        )
+        try:
+            response = await self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+        if user_id and self.pins_user(request, response):
+            await apin_to_primary(user_id)
+        return self.pin(request, response)
+
+    def token_user_id(self, request):
+        return bearer_user_id(request) if settings.DB_REPLICAS else None
+
+    def can_use_replica(self, request):
+        return (
+            request.method in self.safe_methods
+            and self.cookie_name not in request.COOKIES
+        )
 
+    def pins_user(self, request, response):
+        return request.method not in self.safe_methods and response.status_code < 400
+
+    def pin(self, request, response):
+        if request.method not in self.safe_methods and settings.DB_REPLICAS:
+            response.set_cookie(
+                self.cookie_name,
+                "1",
+                max_age=settings.DB_REPLICA_PIN_SECONDS,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite="Lax",
+            )
         return response
 
 
-class QueryTracingMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+def bearer_user_id(request):
+    """
+    The user id a Bearer token claims, without verifying the token, or None
+    """
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    if not header.startswith("Bearer "):
+        return None
+    try:
+        payload = header[len("Bearer ") :].split(".")[1]
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+        return claims.get(settings.SIMPLE_JWT["USER_ID_CLAIM"])
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+# The tracer of the request being handled. Context variables follow the
+# request into the threads the async ORM runs queries in, which connection
+# wrappers installed from the event loop would not.
+current_tracer = ContextVar("current_tracer", default=None)
+
+
+def dispatch_query(execute, sql, params, many, context):
+    tracer = current_tracer.get()
+    if tracer is None:
+        return execute(sql, params, many, context)
+    return tracer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_dispatch(sender=None, connection=None, **kwargs):
+    """Give a connection (one per thread and alias) the tracer dispatch"""
+    if dispatch_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, dispatch_query)
+
+
+class RequestTimer:
+    """
+    Phase timings of one request on the perf_counter clock.
+
+    Each phase is measured exclusive of the SQL run inside it; time spent in
+    the database is reported as the "queryset" phase instead.
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.start = time.perf_counter()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        db_start = self.tracer.duration
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            elapsed -= self.tracer.duration - db_start
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def wrap(self, name, func):
+        """Return `func` timed as part of phase `name`"""
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+
+        return timed
+
+    def breakdown(self):
+        """Every phase including "queryset", in seconds"""
+        return {**self.phases, "queryset": self.tracer.duration}
+
+    def server_timing(self, total):
+        entries = [
+            f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()
+        ]
+        entries.append(
+            f'queryset;dur={self.tracer.duration * 1000:.2f};desc="{self.tracer.count} queries"'
+        )
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
 
-    def __call__(self, request):
-        from django.db import connection, reset_queries
-        import time
 
-        # Clear any existing queries
-        reset_queries()
+class InstrumentationMiddleware(AsyncCapableMiddleware):
+    """
+    Times every request and feeds the Server-Timing header, the Prometheus
+    metrics and the request log.
 
-        # Record start time
-        start = time.time()
+    Every request gets a RequestTimer (as `request.timer`) backed by a query
+    tracer that sees its queries on every connection; views using
+    gimli.instrumentation.PhaseTimingMixin add their DRF phases to it. N+1
+    detection only runs for a QUERY_TRACE_SAMPLE_RATE fraction of requests.
+    """
 
-        # Process the request
-        response = self.get_response(request)
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timer = self.start(request)
+        IN_FLIGHT.inc()
+        try:
+            with self.traced(timer.tracer):
+                response = self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+        return self.finish(request, response, timer)
+
+    async def __acall__(self, request):
+        timer = self.start(request)
+        IN_FLIGHT.inc()
+        try:
+            with self.traced(timer.tracer):
+                response = await self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+        return self.finish(request, response, timer)
+
+    def start(self, request):
+        sampled = random.random() < settings.QUERY_TRACE_SAMPLE_RATE
+        tracer = QueryTracer(
+            settings.QUERY_TRACE_N_PLUS_ONE_THRESHOLD if sampled else None
+        )
+        timer = request.timer = RequestTimer(tracer)
+        return timer
+
+    @contextmanager
+    def traced(self, tracer):
+        """Send the queries of this request, on any connection, to `tracer`"""
+        for conn in connections.all():
+            install_query_dispatch(connection=conn)
+        token = current_tracer.set(tracer)
+        try:
+            yield
+        finally:
+            current_tracer.reset(token)
+
+    def finish(self, request, response, timer):
+        duration = time.perf_counter() - timer.start
+        record_request(
+            request, response, duration, timer.tracer.count, timer.breakdown()
+        )
+        self.log_request(request, response, duration, timer)
+        response["Server-Timing"] = timer.server_timing(duration)
+        return response
 
-        # Calculate duration
-        duration = time.time() - start
+    def log_request(self, request, response, duration, timer):
+        tracer = timer.tracer
 
-        # Initialize query variables
-        query_count = 0
-        query_time = 0
+        # Log if request is slow (over 200ms)
+        if duration > 0.2:
+            logger.warning(
+                "SLOW REQUEST: %s %s took %.2fms",
+                request.method,
+                request.path,
+                duration * 1000,
+            )
 
         # Only log API requests to avoid cluttering logs
         if request.path.startswith("/api/"):
-            # Count and time the queries
-            query_count = len(connection.queries)
-            query_time = (
-                sum(float(q["time"]) for q in connection.queries)
-                if query_count > 0
-                else 0
-            )
-
-            # Log the timing info
-            logger.warning(
-                f"REQUEST TRACE: {request.method} {request.path} - "
-                f"Total: {duration*1000:.2f}ms, "
-                f"DB Queries: {query_count} in {query_time*1000:.2f}ms, "
-                f"Python time: {(duration-query_time)*1000:.2f}ms"
+            # Log the timing info (INFO, so it's dropped cheaply by default)
+            logger.info(
+                "REQUEST TRACE: %s %s - Total: %.2fms, DB Queries: %d in %.2fms",
+                request.method,
+                request.path,
+                duration * 1000,
+                tracer.count,
+                tracer.duration * 1000,
+                extra={
+                    "method": request.method,
+                    "path": request.path,
+                    "status_code": response.status_code,
+                    "duration_ms": round(duration * 1000, 2),
+                    "query_count": tracer.count,
+                    "phases_ms": {
+                        name: round(seconds * 1000, 2)
+                        for name, seconds in timer.breakdown().items()
+                    },
+                },
             )
 
             # Log detailed query info for slow requests
             if duration > 0.5:  # Slow requests (over 500ms)
-                for i, query in enumerate(
-                    connection.queries[:5]
-                ):  # Show only first 5 queries
+                for i, (elapsed, sql) in enumerate(tracer.first):
                     logger.warning(
-                        f"  Query {i+1}: {float(query['time'])*1000:.2f}ms - {query['sql'][:150]}..."
+                        "  Query %d: %.2fms - %s...", i + 1, elapsed * 1000, sql[:150]
                     )
 
-        # Add header with timing info
-        response["X-Request-Duration"] = f"{duration*1000:.2f}ms"
-        response["X-DB-Query-Count"] = str(query_count)
-        response["X-DB-Query-Duration"] = f"{query_time*1000:.2f}ms"
-
-        return response
+        view = getattr(request.resolver_match, "view_name", None) or request.path
+        for count, shape, call_site in tracer.repeated_statements():
+            logger.warning(
+                "N+1 QUERY: %dx in %s (%s %s) at %s: %s",
+                count,
+                view,
+                request.method,
+                request.path,
+                call_site,
+                shape[:200],
+                extra={"view": view, "call_site": call_site, "repeats": count},
+            )
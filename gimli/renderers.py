@@ -0,0 +1,104 @@
+"""
+Faster drop-in renderers and parsers for the API.
+
+ORJSONRenderer produces the same JSON as DRF's JSONRenderer: datetimes,
+Decimals and everything else orjson doesn't handle natively go through
+DRF's encoder, non-string keys are stringified and U+2028/U+2029 are
+escaped. Only indented output (the browsable API, `; indent=` in Accept)
+still goes through the stdlib.
+
+MessagePack is negotiated with `Accept: application/msgpack` (or
+`?format=msgpack`) and carries exactly the values the JSON would, so
+datetimes stay ISO 8601 strings rather than msgpack timestamps.
+
+Neither format has integers wider than 64 bits, which Postgres will still
+store in a jsonb blob: the JSON renderer hands such data to DRF's, and the
+MessagePack one sends those integers as floats, which is what a JavaScript
+client reads from the JSON anyway.
+"""
+
+import math
+
+import msgpack
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# DRF's conversions, for the types orjson and msgpack are told to pass on
+encode_default = JSONEncoder().default
+
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def encode_msgpack_default(obj):
+    # msgpack also passes on integers wider than 64 bits rather than raising
+    if isinstance(obj, int):
+        try:
+            return float(obj)
+        except OverflowError:
+            return math.copysign(math.inf, obj)
+    return encode_default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        if (
+            self.get_indent(accepted_media_type, renderer_context) is not None
+            or self.ensure_ascii
+            or not self.compact
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same as JSONRenderer: keep the output a strict JavaScript subset
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        # orjson only reads UTF-8, which RFC 8259 requires anyway; NaN and
+        # Infinity are rejected, as STRICT_JSON does
+        try:
+            return orjson.loads(stream.read() if stream is not None else b"")
+        except orjson.JSONDecodeError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_msgpack_default, datetime=False)
+
+
+class MessagePackParser(BaseParser):
+    media_type = "application/msgpack"
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read() if stream is not None else b"")
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(
+                "MessagePack parse error - %s" % (str(exc) or "invalid data")
+            )
@@ -1,4 +1,5 @@
 from pathlib import Path
+import mimetypes
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
@@ -55,6 +56,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",
+    "django.contrib.postgres",
     # Third party apps
     "rest_framework",
     "rest_framework.authtoken",
@@ -73,25 +75,34 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "gimli.middleware.ErrorLoggingMiddleware",
-    "gimli.middleware.RequestTimingMiddleware",
-    "gimli.middleware.QueryTracingMiddleware",
+    "gimli.middleware.InstrumentationMiddleware",
+    "gimli.middleware.APICompressionMiddleware",
+    "gimli.middleware.ReplicaRoutingMiddleware",
 ]
 
 # Add whitenoise middleware as the second middleware for production
 if IS_PRODUCTION:
-    MIDDLEWARE.insert(1, "whitenoise.middleware.WhiteNoiseMiddleware")
+    MIDDLEWARE.insert(1, "gimli.middleware.AsyncWhiteNoiseMiddleware")
 
 # Add security headers middleware
 MIDDLEWARE.append("gimli.middleware.SecurityHeadersMiddleware")
 
+# The gimli.middleware versions of CSRF, authentication, messages and
+# X-Frame-Options are Django's, skipped for Bearer-token /api/ requests
+# without a session cookie when API_LEAN_MIDDLEWARE is on (see
+# is_token_api_request). Sessions and allauth stay: allauth insists on its
+# own entry and reads request.session after some API responses, and an
+# unused session costs neither a query nor a cookie.
+API_LEAN_MIDDLEWARE = os.getenv("API_LEAN_MIDDLEWARE", "True") == "True"
+
 MIDDLEWARE += [
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
-    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "gimli.middleware.CsrfViewMiddleware",
+    "gimli.middleware.AuthenticationMiddleware",
+    "gimli.middleware.MessageMiddleware",
+    "gimli.middleware.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
 ]
 
@@ -124,16 +135,25 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "gimli.wsgi.application"
 
+# Connection pooling: with DB_POOL=True each process shares a psycopg 3 pool
+# across its threads instead of keeping a persistent connection per thread
+DB_POOL = os.getenv("DB_POOL", "False") == "True"
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # checkout wait, seconds
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "gimli.db.postgresql_pool",
         "NAME": os.getenv("DB_NAME", "gimli"),
         "USER": os.getenv("DB_USER", "postgres"),
         "PASSWORD": os.getenv("DB_PASSWORD", "postgres"),
         "HOST": os.getenv("DB_HOST", "localhost"),
         "PORT": os.getenv("DB_PORT", "5432"),
-        # Connection pooling settings
-        "CONN_MAX_AGE": 120,  # Increased connection lifetime
+        # Connection pooling settings; pooled connections go back to the
+        # pool at the end of each request instead of persisting
+        "CONN_MAX_AGE": 0 if DB_POOL else 120,
         "CONN_HEALTH_CHECKS": True,
         "ATOMIC_REQUESTS": False,  # Disable auto-transactions for performance
         "OPTIONS": {
@@ -145,6 +165,44 @@ DATABASES = {
     }
 }
 
+if DB_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": DB_POOL_MIN_SIZE,
+        "max_size": DB_POOL_MAX_SIZE,
+        "timeout": DB_POOL_TIMEOUT,
+        "max_idle": DB_POOL_MAX_IDLE,
+    }
+
+# Read replicas for the lore and users apps, as comma-separated host[:port]
+# entries sharing the primary's database, user and password. See
+# gimli/db/routers.py for how reads are routed.
+DB_REPLICA_HOSTS = [
+    host.strip()
+    for host in os.getenv("DB_REPLICA_HOSTS", "").split(",")
+    if host.strip()
+]
+# How long a client's reads stay on the primary after it writes, in seconds
+DB_REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", "15"))
+# Replicas further behind than this get no reads
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "5"))
+
+DB_REPLICAS = []
+for number, replica in enumerate(DB_REPLICA_HOSTS, start=1):
+    host, _, port = replica.partition(":")
+    alias = f"replica_{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+        # Tests run against the primary only
+        "TEST": {"MIRROR": "default"},
+    }
+    DB_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["gimli.db.routers.ReplicaRouter"]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -172,42 +230,123 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 # Configure static files based on environment
 STATICFILES_DIRS = []
 if IS_PRODUCTION:
-    # In production, add the frontend build directory to staticfiles dirs
-    STATICFILES_DIRS = [
-        os.path.join(BASE_DIR, "frontend", "build", "client"),
-    ]
-    # Use basic whitenoise storage without compression to avoid MIME type issues
-    STATICFILES_STORAGE = "whitenoise.storage.StaticFilesStorage"
+    # Django's own static files (admin, browsable API) get hashed names and
+    # gzip/brotli variants at collectstatic. The frontend build isn't
+    # collected: the manifest storage can't resolve Vite's absolute CSS
+    # URLs, and WhiteNoise serves it from WHITENOISE_ROOT anyway.
+    STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
     # Add WhiteNoise configuration for proper static file handling
     WHITENOISE_INDEX_FILE = False  # Don't serve index.html for directory requests
-    WHITENOISE_ROOT = os.path.join(
-        BASE_DIR, "frontend", "build", "client"
-    )  # Serve files from the build directory
+    # Serve files from the build directory. Vite already puts a content hash
+    # in everything under assets/, so those are cached as immutable, and
+    # the build step precompresses the directory with
+    # `python -m whitenoise.compress frontend/build/client`.
+    WHITENOISE_ROOT = os.path.join(BASE_DIR, "frontend", "build", "client")
+
+# Module scripts must never go out as text/plain, which browsers refuse to
+# execute. Python's mimetypes (used in development) reads the OS registry.
+WHITENOISE_MIMETYPES = {
+    ".js": "text/javascript",
+    ".mjs": "text/javascript",
+    ".css": "text/css",
+    ".map": "application/json",
+    ".webmanifest": "application/manifest+json",
+    ".wasm": "application/wasm",
+}
+for extension, media_type in WHITENOISE_MIMETYPES.items():
+    mimetypes.add_type(media_type, extension)
+
+# Compression of /api/ responses: brotli or gzip, whichever the client
+# prefers, for bodies of at least API_COMPRESSION_MIN_SIZE bytes
+API_COMPRESSION_MIN_SIZE = int(os.getenv("API_COMPRESSION_MIN_SIZE", "1024"))
+API_BROTLI_QUALITY = int(os.getenv("API_BROTLI_QUALITY", "4"))
+API_GZIP_LEVEL = int(os.getenv("API_GZIP_LEVEL", "6"))
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Cache backend. LocMemCache is per process, so point CACHE_BACKEND and
+# CACHE_LOCATION at a shared cache when running several workers.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
 # Google OAuth settings
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
 
-print(f"DEBUG: Loaded GOOGLE_CLIENT_ID: {'[SET]' if GOOGLE_CLIENT_ID else '[NOT SET]'}")
-
 # Rest Framework settings
+# orjson-backed JSON rendering/parsing (same output as DRF's), and
+# MessagePack for clients that send Accept: application/msgpack
+API_FAST_JSON = os.getenv("API_FAST_JSON", "True") == "True"
+API_MSGPACK = os.getenv("API_MSGPACK", "True") == "True"
+
+if API_FAST_JSON:
+    API_RENDERERS = ["gimli.renderers.ORJSONRenderer"]
+    API_PARSERS = ["gimli.renderers.ORJSONParser"]
+else:
+    API_RENDERERS = ["rest_framework.renderers.JSONRenderer"]
+    API_PARSERS = ["rest_framework.parsers.JSONParser"]
+API_RENDERERS.append("rest_framework.renderers.BrowsableAPIRenderer")
+API_PARSERS += [
+    "rest_framework.parsers.FormParser",
+    "rest_framework.parsers.MultiPartParser",
+]
+if API_MSGPACK:
+    API_RENDERERS.append("gimli.renderers.MessagePackRenderer")
+    API_PARSERS.append("gimli.renderers.MessagePackParser")
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "gimli.users.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": API_RENDERERS,
+    "DEFAULT_PARSER_CLASSES": API_PARSERS,
 }
 
+# Keyset pagination for lore list endpoints (opt-in via ?page_size= or ?cursor=)
+LORE_PAGE_SIZE = int(os.getenv("LORE_PAGE_SIZE", "50"))
+LORE_MAX_PAGE_SIZE = int(os.getenv("LORE_MAX_PAGE_SIZE", "200"))
+
+# How long campaign owner/roster lookups stay cached for permission checks
+LORE_MEMBERSHIP_CACHE_TTL = int(os.getenv("LORE_MEMBERSHIP_CACHE_TTL", "300"))
+# The most a membership or campaign list entry lives in a per-process cache
+# (LocMemCache), which other workers' invalidations never reach
+LORE_PROCESS_CACHE_TTL = int(os.getenv("LORE_PROCESS_CACHE_TTL", "5"))
+
+# Per-user cache of serialized campaign lists; the alias picks an entry in CACHES
+LORE_LIST_CACHE_ALIAS = os.getenv("LORE_LIST_CACHE_ALIAS", "default")
+LORE_LIST_CACHE_TTL = int(os.getenv("LORE_LIST_CACHE_TTL", "300"))
+
+# Limits for the bulk character create/update endpoint
+LORE_BULK_MAX_ITEMS = int(os.getenv("LORE_BULK_MAX_ITEMS", "1000"))
+LORE_BULK_BATCH_SIZE = int(os.getenv("LORE_BULK_BATCH_SIZE", "500"))
+
+# Maximum campaigns and characters returned by the search endpoint
+LORE_SEARCH_LIMIT = int(os.getenv("LORE_SEARCH_LIMIT", "20"))
+
+# Inline the current user and their campaigns into the SPA shell for page
+# loads carrying the auth cookie, up to SPA_BOOTSTRAP_MAX_BYTES of JSON
+SPA_BOOTSTRAP = os.getenv("SPA_BOOTSTRAP", "True") == "True"
+SPA_BOOTSTRAP_MAX_BYTES = int(os.getenv("SPA_BOOTSTRAP_MAX_BYTES", "65536"))
+
 # Authentication settings
 SITE_ID = 1
 AUTH_USER_MODEL = "users.CustomUser"
 
+# In-process cache of user rows used by CachedJWTAuthentication
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "1024"))
+
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
     "allauth.account.auth_backends.AuthenticationBackend",
@@ -264,7 +403,31 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": None,  # Disable sliding claims
 }
 
-# SQL Query Logging - Enable in both dev and prod until performance issues are resolved
+# N+1 detection: fraction of requests checked, and how many repeats of one
+# statement shape within a request are reported as an N+1 pattern
+QUERY_TRACE_SAMPLE_RATE = float(os.getenv("QUERY_TRACE_SAMPLE_RATE", "1.0"))
+QUERY_TRACE_N_PLUS_ONE_THRESHOLD = int(
+    os.getenv("QUERY_TRACE_N_PLUS_ONE_THRESHOLD", "10")
+)
+
+# Serve GETs on the hot lore and user endpoints from native async views.
+# gimli/asgi.py turns this on; under WSGI it would only add overhead.
+ASYNC_READS = os.getenv("ASYNC_READS", "False") == "True"
+
+# Bearer token required to scrape /api/metrics/. When empty, the endpoint
+# is open in development and returns 404 in production.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Logging: records are queued and written as JSON by a background thread.
+# SQL statements go through a sampling / rate-limiting filter so they can
+# stay on in production; set SQL_LOG_LEVEL=DEBUG to see them.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING")
+SQL_LOG_LEVEL = os.getenv("SQL_LOG_LEVEL", LOG_LEVEL)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "verbose"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+SQL_LOG_SAMPLE_RATE = float(os.getenv("SQL_LOG_SAMPLE_RATE", "1.0"))
+SQL_LOG_RATE_LIMIT = int(os.getenv("SQL_LOG_RATE_LIMIT", "200"))  # per second
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -273,23 +436,43 @@ LOGGING = {
             "format": "{levelname} {asctime} {module} {process:d} {thread:d} {message}",
             "style": "{",
         },
+        "json": {
+            "()": "gimli.log.JSONFormatter",
+        },
+    },
+    "filters": {
+        "sql_sampling": {
+            "()": "gimli.log.SamplingFilter",
+            "sample_rate": SQL_LOG_SAMPLE_RATE,
+            "rate_limit": SQL_LOG_RATE_LIMIT,
+        },
     },
     "handlers": {
         "console": {
-            "level": "WARNING",  # Set to WARNING to focus on slow queries only
             "class": "logging.StreamHandler",
-            "formatter": "verbose",
+            "formatter": LOG_FORMAT,
+        },
+        "queue": {
+            "()": "gimli.log.BackgroundQueueHandler",
+            "target_handlers": ["console"],
+            "queue_size": LOG_QUEUE_SIZE,
         },
     },
     "loggers": {
         "django.request": {
-            "handlers": ["console"],
-            "level": "WARNING",
+            "handlers": ["queue"],
+            "level": LOG_LEVEL,
             "propagate": False,
         },
         "django.db.backends": {
-            "handlers": ["console"],
-            "level": "DEBUG",  # Changed from WARNING to DEBUG to log all individual queries
+            "handlers": ["queue"],
+            "level": SQL_LOG_LEVEL,
+            "filters": ["sql_sampling"],
+            "propagate": False,
+        },
+        "gimli": {
+            "handlers": ["queue"],
+            "level": LOG_LEVEL,
             "propagate": False,
         },
     },
@@ -0,0 +1,179 @@
+"""
+The single-page app's shell, served from memory.
+
+The built index.html is rendered once per process and kept as bytes with an
+ETag, so a deep link costs a stat() of the file rather than a template
+lookup and render. A changed stat signature (a new build, or the file
+replaced in place) renders it again on the next request. The shell is
+served with `Cache-Control: no-cache`: browsers revalidate it on every
+navigation, which costs a 304 as long as the build is unchanged.
+
+With SPA_BOOTSTRAP, page loads carrying the auth cookie get the responses
+the frontend would otherwise fetch first (the user, then their campaigns)
+inlined as a `<script id="gimli-bootstrap" type="application/json">` block.
+They come from the API views themselves, called with the cookie's token as
+a Bearer header, so permissions, caching and serialization are the API's.
+"""
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.template import engines
+from django.template.loader import get_template
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.html import json_script
+from django.views.decorators.http import require_safe
+from rest_framework.utils.encoders import JSONEncoder
+
+from gimli.lore.views import CampaignViewSet
+from gimli.users.views import UserDetailsView
+
+BOOTSTRAP_ELEMENT_ID = "gimli-bootstrap"
+
+# Payload key, API path and view, in the order the frontend needs them.
+# When the payload is over SPA_BOOTSTRAP_MAX_BYTES, keys are dropped from
+# the end; without the user there is nothing to bootstrap.
+BOOTSTRAP_SOURCES = (
+    ("user", "/api/auth/user/", UserDetailsView.as_view()),
+    ("campaigns", "/api/lore/campaigns/", CampaignViewSet.as_view({"get": "list"})),
+)
+
+# Headers of the page load that must not reach the API views
+PAGE_ONLY_HEADERS = (
+    "HTTP_COOKIE",
+    "HTTP_IF_NONE_MATCH",
+    "HTTP_IF_MODIFIED_SINCE",
+    "HTTP_ACCEPT_ENCODING",
+)
+
+
+@dataclass(frozen=True)
+class Shell:
+    content: bytes
+    etag: str
+    signature: tuple
+    # Where the bootstrap script goes: before </head>, or at the very end
+    insert_at: int
+
+
+class ShellCache:
+    def __init__(self, template_name="index.html"):
+        self.template_name = template_name
+        self.path = None
+        self.shell = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        # Located through the template loaders once; the cached loader
+        # wouldn't notice a rebuild, so the file itself is watched from here
+        if self.path is None:
+            self.path = get_template(self.template_name).origin.name
+        signature = file_signature(self.path)
+        shell = self.shell
+        if shell is None or shell.signature != signature:
+            with self.lock:
+                shell = self.shell
+                if shell is None or shell.signature != signature:
+                    shell = self.shell = self.render(signature)
+        return shell
+
+    def render(self, signature):
+        with open(self.path, encoding="utf-8") as f:
+            template = engines["django"].from_string(f.read())
+        content = template.render().encode()
+        etag = '"%s"' % hashlib.sha1(content).hexdigest()
+        insert_at = content.find(b"</head>")
+        if insert_at == -1:
+            insert_at = len(content)
+        return Shell(content, etag, signature, insert_at)
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+spa_shell = ShellCache()
+
+
+def bootstrap_script(request):
+    """The escaped bootstrap `<script>` for this page load, or None"""
+    token = request.COOKIES.get(settings.REST_AUTH["JWT_AUTH_COOKIE"])
+    if not token:
+        return None
+
+    payload = {}
+    for key, path, view in BOOTSTRAP_SOURCES:
+        response = view(api_request(request, path, token))
+        if response.status_code != 200:
+            break
+        payload[key] = response.data
+    if "user" not in payload:
+        return None
+
+    while payload:
+        script = json_script(payload, BOOTSTRAP_ELEMENT_ID, encoder=JSONEncoder)
+        script = script.encode()
+        if len(script) <= settings.SPA_BOOTSTRAP_MAX_BYTES:
+            return script
+        payload.popitem()
+    return None
+
+
+def api_request(request, path, token):
+    """A GET of `path` as the frontend would make it with `token`"""
+    sub_request = HttpRequest()
+    sub_request.method = "GET"
+    sub_request.path = sub_request.path_info = path
+    sub_request.META = {
+        name: value
+        for name, value in request.META.items()
+        if name not in PAGE_ONLY_HEADERS
+    }
+    sub_request.META.update(
+        {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "HTTP_ACCEPT": "application/json",
+            "HTTP_AUTHORIZATION": f"Bearer {token}",
+        }
+    )
+    return sub_request
+
+
+@require_safe
+def serve_spa(request):
+    shell = spa_shell.get()
+    bootstrap = bootstrap_script(request) if settings.SPA_BOOTSTRAP else None
+
+    if bootstrap is None:
+        response = get_conditional_response(request, etag=shell.etag)
+        if response is None:
+            response = HttpResponse(
+                shell.content, content_type="text/html; charset=utf-8"
+            )
+        response["ETag"] = shell.etag
+        patch_cache_control(response, no_cache=True)
+    else:
+        content = b"".join(
+            (
+                shell.content[: shell.insert_at],
+                bootstrap,
+                shell.content[shell.insert_at :],
+            )
+        )
+        response = HttpResponse(content, content_type="text/html; charset=utf-8")
+        patch_cache_control(response, private=True, no_cache=True)
+
+    if settings.SPA_BOOTSTRAP:
+        patch_vary_headers(response, ("Cookie",))
+    return response
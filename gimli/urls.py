@@ -1,6 +1,5 @@
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.views.generic import TemplateView
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import (
@@ -8,19 +7,14 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from django.http import JsonResponse
+from gimli.metrics import metrics_view
+from gimli.spa import serve_spa
 import os
 import time
 import logging
 
 logger = logging.getLogger("django.request")
 
-print("DEBUG: Loading main URLs configuration")  # Debug log
-
-
-# Simple function to serve the SPA
-def serve_spa(request):
-    return TemplateView.as_view(template_name="index.html")(request)
-
 
 # Health check endpoint for Railway
 def health_check(request):
@@ -51,17 +45,28 @@ def perf_test(request):
     )
 
 
+def lazy_include(module):
+    """
+    include() for a URLconf without an app_name, imported the first time a
+    URL resolves into it or anything is reversed rather than at startup
+    """
+    return (module, None, None)
+
+
 # Define all API and admin routes first
 api_and_admin_patterns = [
     path("admin/", admin.site.urls),
     path("api/auth/", include("gimli.users.urls")),
     path("api/auth/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/auth/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
-    path("accounts/", include("allauth.urls")),
+    # allauth's URLconf imports every provider's views, and the Google one
+    # PyJWT and cryptography; API workers rarely serve /accounts/
+    path("accounts/", lazy_include("allauth.urls")),
     path("api/lore/", include("gimli.lore.urls")),
     path("api/", include("gimli.lore.urls")),
     path("api/health/", health_check, name="health_check"),
     path("api/perf-test/", perf_test, name="perf_test"),
+    path("api/metrics/", metrics_view, name="metrics"),
 ]
 
 # Handle SPA routes
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'gimli.users' 
\ No newline at end of file
+    name = 'gimli.users'
+
+    def ready(self):
+        from . import signals  # noqa: F401 
\ No newline at end of file
@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+
+class UserRowCache:
+    """
+    Thread-safe, size-bounded LRU of user rows with a per-entry TTL.
+
+    Rows are kept as plain field values rather than model instances, so
+    every request gets its own CustomUser and can't leak changes into
+    another one.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, values = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return values
+
+    def set(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_row_cache = UserRowCache(
+    maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL
+)
+
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields]
+IS_ACTIVE_INDEX = USER_FIELDS.index("is_active")
+
+
+def load_user(user_id):
+    """
+    Return the full CustomUser for `user_id`, from the row cache when
+    possible and from the database otherwise.
+    """
+    values = user_row_cache.get(user_id)
+    if values is None:
+        values = cache_user_row(user_id, user_row_query(user_id).first())
+    return build_user(values)
+
+
+async def aload_user(user_id):
+    """load_user for async views"""
+    values = user_row_cache.get(user_id)
+    if values is None:
+        values = cache_user_row(user_id, await user_row_query(user_id).afirst())
+    return build_user(values)
+
+
+def user_row_query(user_id):
+    # From the primary, as the row is cached (see gimli.db.routers)
+    return (
+        User.objects.using(DEFAULT_DB_ALIAS)
+        .filter(**{api_settings.USER_ID_FIELD: user_id})
+        .values_list(*USER_FIELDS)
+    )
+
+
+def cache_user_row(user_id, values):
+    if values is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+    user_row_cache.set(user_id, values)
+    return values
+
+
+def build_user(values):
+    user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+    if not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+    return user
+
+
+class TokenUser(SimpleLazyObject):
+    """
+    A user built from verified token claims.
+
+    `id`, `pk` and the authentication flags come straight from the token.
+    Touching anything else (or passing the user to the ORM) loads the full
+    CustomUser through `load_user`.
+    """
+
+    def __init__(self, user_id):
+        self.__dict__["_user_id"] = user_id
+        super().__init__(partial(load_user, user_id))
+
+    def __bool__(self):
+        return True
+
+    @property
+    def id(self):
+        return self.__dict__["_user_id"]
+
+    @property
+    def pk(self):
+        return self.__dict__["_user_id"]
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that only queries users_customuser for rows missing
+    from user_row_cache.
+
+    The signed token is trusted for the user id and the cached row for
+    whether the account is still active, so a deactivated user keeps access
+    for up to AUTH_USER_CACHE_TTL seconds in processes other than the one
+    that saved them.
+    """
+
+    # Validated in aprepare, so authenticate() doesn't do it again
+    prepared = None
+
+    async def aprepare(self, request):
+        """
+        Load the token user's row on the async ORM when it isn't cached, so
+        authenticate() doesn't query on the event loop in async views.
+        Invalid tokens are left for authenticate() to reject.
+        """
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return
+        try:
+            validated_token = self.get_validated_token(raw_token)
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except (InvalidToken, KeyError):
+            return
+        self.prepared = (raw_token, validated_token)
+        if user_row_cache.get(user_id) is None:
+            values = await user_row_query(user_id).afirst()
+            if values is not None:
+                user_row_cache.set(user_id, values)
+
+    def get_validated_token(self, raw_token):
+        if self.prepared is not None and self.prepared[0] == raw_token:
+            return self.prepared[1]
+        return super().get_validated_token(raw_token)
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        values = user_row_cache.get(user_id)
+        if values is None:
+            values = cache_user_row(user_id, user_row_query(user_id).first())
+        if not values[IS_ACTIVE_INDEX]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return TokenUser(user_id)
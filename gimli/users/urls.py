@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import GoogleLoginView, UserDetailsView
+from gimli.async_views import async_read_view
+from .views import GoogleLoginView, LogoutView, UserDetailsView
 
 urlpatterns = [
     path('google/', GoogleLoginView.as_view(), name='google_login'),
-    path('user/', UserDetailsView.as_view(), name='user_details'),
+    path('user/', async_read_view(UserDetailsView), name='user_details'),
+    path('logout/', LogoutView.as_view(), name='logout'),
 ] 
\ No newline at end of file
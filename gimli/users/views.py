@@ -1,32 +1,57 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from google.oauth2 import id_token
-from google.auth.transport import requests
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated
 import logging
+from gimli.async_views import AsyncReadMixin
+from gimli.instrumentation import PhaseTimingMixin
+from gimli.users.authentication import aload_user
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
-class UserDetailsView(APIView):
+def user_details(user):
+    return {
+        "id": user.id,
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+    }
+
+
+def set_auth_cookie(response, access_token):
+    """
+    Also hand the access token to the browser as an httponly cookie, which
+    page loads carry and API requests don't: serve_spa reads it to inline
+    the user's data into the shell. The API itself only accepts the header.
+    """
+    if not settings.SPA_BOOTSTRAP:
+        return
+    response.set_cookie(
+        settings.REST_AUTH["JWT_AUTH_COOKIE"],
+        access_token,
+        max_age=int(settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"].total_seconds()),
+        secure=settings.REST_AUTH["JWT_AUTH_SECURE"],
+        httponly=settings.REST_AUTH["JWT_AUTH_HTTPONLY"],
+        samesite="Lax",
+    )
+
+
+class UserDetailsView(PhaseTimingMixin, AsyncReadMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        return Response(
-            {
-                "id": user.id,
-                "email": user.email,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-            },
-            status=status.HTTP_200_OK,
-        )
+        return self.user_response(request.user)
+
+    async def aget(self, request):
+        return self.user_response(await aload_user(request.user.id))
+
+    def user_response(self, user):
+        return Response(user_details(user), status=status.HTTP_200_OK)
 
 
 class GoogleLoginView(APIView):
@@ -34,6 +59,11 @@ class GoogleLoginView(APIView):
     permission_classes = []
 
     def post(self, request):
+        # google-auth pulls in cryptography; only logins need it, so workers
+        # don't load it at startup
+        from google.auth.transport import requests
+        from google.oauth2 import id_token
+
         try:
             id_token_value = request.data.get("id_token")
             if not id_token_value:
@@ -70,17 +100,9 @@ class GoogleLoginView(APIView):
                     "access": str(refresh.access_token),
                 }
 
-                return Response(
-                    {
-                        "user": {
-                            "id": user.id,
-                            "email": user.email,
-                            "first_name": user.first_name,
-                            "last_name": user.last_name,
-                        },
-                        "tokens": tokens,
-                    }
-                )
+                response = Response({"user": user_details(user), "tokens": tokens})
+                set_auth_cookie(response, tokens["access"])
+                return response
 
             except ValueError as e:
                 return Response(
@@ -93,3 +115,15 @@ class GoogleLoginView(APIView):
                 {"error": "Authentication failed"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+
+
+class LogoutView(APIView):
+    """Drop the auth cookie; the tokens themselves live in the client"""
+
+    authentication_classes = []
+    permission_classes = []
+
+    def post(self, request):
+        response = Response(status=status.HTTP_204_NO_CONTENT)
+        response.delete_cookie(settings.REST_AUTH["JWT_AUTH_COOKIE"], samesite="Lax")
+        return response
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+
+# Workers write their metrics to mmap-backed files here so /api/metrics/ can
+# aggregate them. It has to be set before prometheus_client is imported, which
+# is also why the import below is deferred.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "gimli-metrics")
+)
+# With preload_app the master imports the application, and with it the
+# metrics, before on_starting runs
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+# With DB_POOL=True threads share the pool, so they don't each hold a
+# Postgres connection
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+
+# Set to uvicorn.workers.UvicornWorker (and serve gimli.asgi:application) to
+# run the async read paths
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+
+# Import the application once in the master, so workers started on boot and
+# after recycling fork with everything loaded instead of importing it again
+preload_app = os.getenv("GUNICORN_PRELOAD", "True") == "True"
+
+
+def on_starting(server):
+    # Files left by a previous run would be summed into the new one. The
+    # master's own files go too; workers open theirs once they've forked.
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        # The URLconf and the views it imports would otherwise load on each
+        # worker's first request
+        from django.urls import get_resolver
+
+        get_resolver().url_patterns
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)